@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.datagen import ADMINS_PER_CHAT, admin_ids_for, chat_index_for, dataset_size, generate
+from benchmarks.fake_api import FakeTelegramAPI, server_url, start_server
+from benchmarks.fake_bot import FAKE_TOKEN, make_bot
+from benchmarks.suite import bench_active_ads, bench_admin_check, bench_scheduler_tick, peak_rss_mb
+
+
+SCENARIOS = ("scheduler", "active_ads", "admin_check")
+
+# session — ответы прямо из сессии бота, http — через aiohttp и локальный FakeTelegramAPI
+TRANSPORTS = ("session", "http")
+
+# Метрики, сравниваемые с эталоном: (раздел, метрика) -> True, если больше — лучше
+COMPARED_METRICS: Dict[Tuple[str, str], bool] = {
+    ("scheduler_tick", "p50_ms"): False,
+    ("scheduler_tick", "p99_ms"): False,
+    ("scheduler_tick", "queries_per_tick"): False,
+    ("scheduler_tick", "sends_per_sec"): True,
+    ("active_ads", "p50_ms"): False,
+    ("active_ads", "p99_ms"): False,
+    ("active_ads", "queries_per_call"): False,
+    ("admin_check", "p50_us"): False,
+    ("admin_check", "p99_us"): False,
+    ("admin_check", "queries_per_call"): False,
+    ("process", "peak_rss_mb"): False,
+}
+
+# Параметры запуска, при различии которых сравнение с эталоном теряет смысл
+META_KEYS = (
+    "chats", "ads", "transport", "ticks", "tick_seconds", "latency", "concurrency", "events",
+    "retry_after_rate", "kicked_rate", "timeout_rate",
+)
+
+
+def compare(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float
+) -> Tuple[List[str], List[str]]:
+    """Сравнивает результаты с эталоном и возвращает строки отчёта и список регрессий"""
+    lines = []
+    regressions = []
+    for (section, metric), higher_is_better in COMPARED_METRICS.items():
+        base = baseline.get("results", {}).get(section, {}).get(metric)
+        current = results.get("results", {}).get(section, {}).get(metric)
+        if base is None or current is None:
+            continue
+
+        if higher_is_better:
+            regressed = current < base * (1 - tolerance)
+        else:
+            regressed = current > base * (1 + tolerance)
+        change = f"{(current - base) / base * 100:+.1f}%" if base else "—"
+        status = "РЕГРЕССИЯ" if regressed else "ok"
+        name = f"{section}.{metric}"
+        lines.append(f"{name:<32} {base:>12} {current:>12} {change:>9}  {status}")
+        if regressed:
+            regressions.append(name)
+
+    return lines, regressions
+
+
+def _chat_admins(chat_id: int) -> List[int]:
+    return admin_ids_for(chat_index_for(chat_id), ADMINS_PER_CHAT)
+
+
+@asynccontextmanager
+async def open_transport(args: argparse.Namespace) -> AsyncIterator[Tuple[Bot, Callable[[], int]]]:
+    """Создаёт бота с выбранным фейковым Telegram и счётчик принятых им сообщений"""
+    if args.transport == "session":
+        bot = make_bot(args.latency, admins=_chat_admins)
+        try:
+            yield bot, lambda: bot.session.sent
+        finally:
+            await bot.session.close()
+        return
+
+    api = FakeTelegramAPI(
+        latency=args.latency,
+        retry_after_rate=args.retry_after_rate,
+        kicked_rate=args.kicked_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_delay=args.request_timeout * 2,
+        admins=_chat_admins
+    )
+    runner = await start_server(api)
+    session = AiohttpSession(
+        api=TelegramAPIServer.from_base(server_url(runner)),
+        limit=args.concurrency,
+        timeout=args.request_timeout
+    )
+    bot = Bot(FAKE_TOKEN, session=session)
+    try:
+        yield bot, lambda: api.sent
+    finally:
+        await session.close()
+        await runner.cleanup()
+        print(f"Фейковый Telegram: {json.dumps(api.stats(), ensure_ascii=False)}", file=sys.stderr)
+
+
+async def run(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    chats, ads = dataset_size(db_path)
+    results: Dict[str, Any] = {}
+
+    async with open_transport(args) as (bot, sent_count):
+        if "scheduler" in args.scenarios:
+            results["scheduler_tick"] = await bench_scheduler_tick(
+                db_path, bot, sent_count, args.ticks, args.tick_seconds, args.concurrency
+            )
+        if "active_ads" in args.scenarios:
+            results["active_ads"] = await bench_active_ads(db_path, args.repeat)
+        if "admin_check" in args.scenarios:
+            results["admin_check"] = await bench_admin_check(db_path, bot, chats, args.events)
+    results["process"] = {"peak_rss_mb": peak_rss_mb()}
+
+    return {
+        "meta": {
+            "chats": chats,
+            "ads": ads,
+            "transport": args.transport,
+            "ticks": args.ticks,
+            "tick_seconds": args.tick_seconds,
+            "latency": args.latency,
+            "concurrency": args.concurrency,
+            "events": args.events,
+            "retry_after_rate": args.retry_after_rate,
+            "kicked_rate": args.kicked_rate,
+            "timeout_rate": args.timeout_rate,
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки базы данных, планировщика и проверки прав")
+    parser.add_argument("--db", help="готовый набор данных (python -m benchmarks.datagen)")
+    parser.add_argument("--chats", type=int, default=1000, help="размер набора, если --db не задан")
+    parser.add_argument("--ads", type=int, default=20000, help="размер набора, если --db не задан")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--ticks", type=int, default=20)
+    parser.add_argument("--tick-seconds", type=int, default=60, help="шаг виртуального времени между рассылками")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="session")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа фейкового Telegram, с")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="доля ответов 429 (только http)")
+    parser.add_argument("--kicked-rate", type=float, default=0.0, help="доля ответов «bot was kicked» (только http)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="доля запросов без ответа (только http)")
+    parser.add_argument("--request-timeout", type=float, default=5.0, help="таймаут запроса бота, с (только http)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5, help="повторов get_active_advertisements")
+    parser.add_argument("--events", type=int, default=5000, help="сообщений для AdminCheckMiddleware")
+    parser.add_argument("--baseline", help="JSON-файл эталона для сравнения")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты в --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение метрики (доля)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="reklama-bench-") as workdir:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(workdir, "reklama.db")
+            generate(db_path, args.chats, args.ads)
+        results = asyncio.run(run(args, db_path))
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if not args.baseline:
+        return
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Эталон записан в {args.baseline}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+
+    mismatched = [
+        key for key in META_KEYS
+        if baseline.get("meta", {}).get(key) != results["meta"][key]
+    ]
+    if mismatched:
+        print(f"Внимание: параметры запуска отличаются от эталона: {', '.join(mismatched)}")
+
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print(f"\n{'метрика':<32} {'эталон':>12} {'сейчас':>12} {'разница':>9}")
+    print("\n".join(lines))
+    if regressions:
+        print(f"\nРегрессии (допуск {args.tolerance:.0%}): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from typing import Iterator, List, Tuple
+
+from database.database import Database
+
+
+# Интервалы показа (в минутах), из которых выбираются интервалы объявлений
+INTERVALS = (30, 60, 120, 180, 360, 720, 1440)
+
+WORDS = (
+    "скидка", "акция", "распродажа", "доставка", "бесплатно", "магазин", "новинка",
+    "подписка", "курс", "обучение", "квартира", "аренда", "ремонт", "такси", "кафе",
+    "пицца", "кофе", "спорт", "фитнес", "билеты", "концерт", "работа", "вакансия",
+    "telegram", "канал", "чат", "промокод", "подарок", "сегодня", "только", "сейчас",
+)
+
+# Первый ID пользователя-администратора; администраторы чата i — ADMIN_BASE + i * 10 + k
+ADMIN_BASE = 1_000_000
+ADMINS_PER_CHAT = 2
+
+
+def chat_id_for(index: int) -> int:
+    """Возвращает ID супергруппы с порядковым номером index"""
+    return -1_000_000_000_000 - index
+
+
+def chat_index_for(chat_id: int) -> int:
+    """Возвращает порядковый номер супергруппы по её ID"""
+    return -1_000_000_000_000 - chat_id
+
+
+def admin_ids_for(index: int, admins_per_chat: int) -> List[int]:
+    """Возвращает ID администраторов чата с порядковым номером index"""
+    return [ADMIN_BASE + index * 10 + k for k in range(admins_per_chat)]
+
+
+def dataset_start(path: str) -> int:
+    """Возвращает момент генерации набора данных (самое раннее время следующей отправки)"""
+    connection = sqlite3.connect(path)
+    try:
+        row = connection.execute("SELECT MIN(next_due_at) FROM advertisements").fetchone()
+    finally:
+        connection.close()
+    return row[0] if row[0] is not None else int(time.time())
+
+
+def dataset_size(path: str) -> Tuple[int, int]:
+    """Возвращает число чатов и объявлений в наборе данных"""
+    connection = sqlite3.connect(path)
+    try:
+        chats = connection.execute("SELECT COUNT(*) FROM chat_settings").fetchone()[0]
+        ads = connection.execute("SELECT COUNT(*) FROM advertisements").fetchone()[0]
+    finally:
+        connection.close()
+    return chats, ads
+
+
+def _random_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+
+
+def _generate_ads(
+    rng: random.Random,
+    chats: int,
+    ads: int,
+    now: int
+) -> Iterator[Tuple]:
+    for _ in range(ads):
+        interval = rng.choice(INTERVALS)
+        created_at = now - rng.randint(0, 7 * 86400)
+        duration = 60 * 24 * 365
+        roll = rng.random()
+        if roll < 0.7:
+            media_type, media_file_id = None, None
+        elif roll < 0.9:
+            media_type, media_file_id = "photo", f"AgACAgIAAx{rng.getrandbits(64):x}"
+        else:
+            media_type, media_file_id = "video", f"BAACAgIAAx{rng.getrandbits(64):x}"
+        button_text, button_url = None, None
+        if rng.random() < 0.3:
+            button_text, button_url = "Подробнее", f"https://example.com/{rng.getrandbits(32):x}"
+
+        yield (
+            chat_id_for(rng.randrange(chats)),
+            _random_text(rng),
+            media_type,
+            media_file_id,
+            rng.randint(1, 50) if rng.random() < 0.2 else None,
+            button_text,
+            button_url,
+            interval,
+            duration,
+            int(rng.random() < 0.9),
+            created_at,
+            now - rng.randint(0, interval * 60),
+            # Отправки равномерно распределены по интервалу, как у давно работающего бота
+            now + rng.randint(0, interval * 60),
+            created_at + duration * 60,
+        )
+
+
+def generate(
+    path: str,
+    chats: int = 1000,
+    ads: int = 20000,
+    admins_per_chat: int = ADMINS_PER_CHAT,
+    enabled_ratio: float = 0.95,
+    seed: int = 1,
+    batch_size: int = 50000
+) -> int:
+    """Создаёт базу со схемой бота и заполняет её синтетическими чатами и объявлениями"""
+    if os.path.exists(path):
+        raise FileExistsError(f"Файл {path} уже существует")
+
+    async def create_schema():
+        db = Database(path)
+        try:
+            await db.create_tables()
+        finally:
+            await db.close()
+
+    asyncio.run(create_schema())
+
+    rng = random.Random(seed)
+    now = int(time.time())
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("PRAGMA synchronous = OFF")
+
+        # Триггеры FTS на каждую строку заметно замедляют массовую вставку,
+        # поэтому они снимаются, а индекс перестраивается один раз в конце
+        triggers = connection.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'advertisements'"
+        ).fetchall()
+        for name, _ in triggers:
+            connection.execute(f"DROP TRIGGER {name}")
+
+        with connection:
+            connection.executemany(
+                "INSERT INTO chat_settings (chat_id, is_enabled, admin_ids) VALUES (?, ?, '[]')",
+                ((chat_id_for(i), int(rng.random() < enabled_ratio)) for i in range(chats))
+            )
+            connection.executemany(
+                "INSERT INTO chat_admins (chat_id, user_id) VALUES (?, ?)",
+                (
+                    (chat_id_for(i), user_id)
+                    for i in range(chats)
+                    for user_id in admin_ids_for(i, admins_per_chat)
+                )
+            )
+
+        rows = _generate_ads(rng, chats, ads, now)
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            with connection:
+                connection.executemany(
+                    """
+                    INSERT INTO advertisements (
+                        chat_id, text, media_type, media_file_id, topic_id,
+                        button_text, button_url, interval_minutes, duration_minutes,
+                        is_active, created_at, last_sent_at, next_due_at, expires_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    batch
+                )
+
+        with connection:
+            for _, sql in triggers:
+                connection.execute(sql)
+            if triggers:
+                connection.execute("INSERT INTO ads_fts (ads_fts) VALUES ('rebuild')")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+
+    return ads
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической базы объявлений")
+    parser.add_argument("out", help="путь к создаваемой базе")
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--ads", type=int, default=20000)
+    parser.add_argument("--admins-per-chat", type=int, default=ADMINS_PER_CHAT)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.out, args.chats, args.ads, args.admins_per_chat, seed=args.seed)
+    print(f"{args.out}: {args.chats} чатов, {args.ads} объявлений за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
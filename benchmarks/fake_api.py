@@ -0,0 +1,337 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from aiohttp import web
+
+
+logger = logging.getLogger(__name__)
+
+# chat_id -> ID администраторов чата
+AdminsProvider = Callable[[int], Iterable[int]]
+
+# Методы, к которым применяются сбои; getUpdates и служебные методы отвечают всегда
+FAULTY_METHODS = frozenset({
+    "sendmessage", "sendphoto", "sendvideo", "sendanimation", "editmessagetext",
+    "getchatmember", "getchatadministrators",
+})
+
+SEND_METHODS = {
+    "sendmessage": None,
+    "sendphoto": "photo",
+    "sendvideo": "video",
+    "sendanimation": "animation",
+}
+
+KICKED_DESCRIPTION = "Forbidden: bot was kicked from the supergroup chat"
+
+
+class FakeTelegramAPI:
+    """Локальная замена api.telegram.org на aiohttp с задержками и внедрением сбоев"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        retry_after_rate: float = 0.0,
+        retry_after: int = 1,
+        kicked_rate: float = 0.0,
+        kicked_chats: Iterable[int] = (),
+        timeout_rate: float = 0.0,
+        timeout_delay: float = 120.0,
+        admins: Optional[AdminsProvider] = None,
+        bot_id: int = 123456789,
+        seed: int = 1
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.kicked_rate = kicked_rate
+        self.kicked_chats: Set[int] = set(kicked_chats)
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.admins = admins or (lambda chat_id: ())
+        self.bot_id = bot_id
+        self.rng = random.Random(seed)
+
+        self.calls: Counter = Counter()
+        self.faults: Counter = Counter()
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._updates_event = asyncio.Event()
+        self._message_id = 0
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle_method)
+        app.router.add_post("/fake/updates", self._handle_push_updates)
+        app.router.add_get("/fake/stats", self._handle_stats)
+        return app
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """Ставит обновление в очередь getUpdates и возвращает присвоенный update_id"""
+        update = dict(update)
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._updates_event.set()
+        return update["update_id"]
+
+    @property
+    def sent(self) -> int:
+        """Число успешно «отправленных» сообщений"""
+        return self._message_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "faults": dict(self.faults),
+            "sent": self.sent,
+            "pending_updates": len(self._updates),
+        }
+
+    async def _handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._read_params(request)
+        self.calls[method] += 1
+
+        if method == "getupdates":
+            return self._ok(await self._get_updates(params))
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.rng.random() * self.jitter)
+
+        if method in FAULTY_METHODS:
+            fault = await self._inject_fault(method, params)
+            if fault is not None:
+                return fault
+
+        handler = getattr(self, f"_method_{method}", None)
+        if method in SEND_METHODS:
+            result = self._send(params, SEND_METHODS[method])
+        elif handler is not None:
+            result = handler(params)
+        else:
+            # Остальные методы (answerCallbackQuery, deleteWebhook и т.п.) просто подтверждаются
+            result = True
+        return self._ok(result)
+
+    async def _read_params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params: Dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            params.update((await request.post()).items())
+        return params
+
+    async def _inject_fault(self, method: str, params: Dict[str, Any]) -> Optional[web.Response]:
+        if self.timeout_rate and self.rng.random() < self.timeout_rate:
+            # Клиент должен оборвать запрос по своему таймауту раньше, чем придёт ответ
+            self.faults["timeout"] += 1
+            await asyncio.sleep(self.timeout_delay)
+            return self._ok(True)
+
+        if self.retry_after_rate and self.rng.random() < self.retry_after_rate:
+            self.faults["retry_after"] += 1
+            return self._error(
+                429,
+                f"Too Many Requests: retry after {self.retry_after}",
+                {"retry_after": self.retry_after}
+            )
+
+        chat_id = self._int(params.get("chat_id"))
+        if chat_id is not None and (
+            chat_id in self.kicked_chats
+            or (self.kicked_rate and self.rng.random() < self.kicked_rate)
+        ):
+            self.kicked_chats.add(chat_id)
+            self.faults["kicked"] += 1
+            return self._error(403, KICKED_DESCRIPTION)
+        return None
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = self._int(params.get("offset")) or 0
+        limit = self._int(params.get("limit")) or 100
+        timeout = self._int(params.get("timeout")) or 0
+
+        # Обновления с update_id меньше offset считаются подтверждёнными
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _send(self, params: Dict[str, Any], media_type: Optional[str]) -> Dict[str, Any]:
+        message = self._message(params)
+        if media_type is None:
+            message["text"] = params.get("text", "")
+            return message
+
+        file_id = params.get(media_type) or f"fake-{media_type}"
+        media = {"file_id": file_id, "file_unique_id": file_id[-16:], "width": 640, "height": 480}
+        if media_type == "photo":
+            message["photo"] = [media]
+        else:
+            message[media_type] = {**media, "duration": 10}
+        if params.get("caption"):
+            message["caption"] = params["caption"]
+        return message
+
+    def _method_getme(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {"id": self.bot_id, "is_bot": True, "first_name": "Fake bot", "username": "fake_bot"}
+
+    def _method_editmessagetext(self, params: Dict[str, Any]) -> Any:
+        if params.get("inline_message_id"):
+            return True
+        message = self._message(params, new=False)
+        message["text"] = params.get("text", "")
+        message["edit_date"] = int(time.time())
+        return message
+
+    def _method_getchatmember(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = self._int(params.get("chat_id"))
+        user_id = self._int(params.get("user_id"))
+        if user_id in set(self.admins(chat_id)):
+            return self._admin(user_id)
+        return {"status": "member", "user": self._user(user_id)}
+
+    def _method_getchatadministrators(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        chat_id = self._int(params.get("chat_id"))
+        return [self._admin(user_id) for user_id in self.admins(chat_id)]
+
+    def _message(self, params: Dict[str, Any], new: bool = True) -> Dict[str, Any]:
+        chat_id = self._int(params.get("chat_id")) or 0
+        if new:
+            self._message_id += 1
+            message_id = self._message_id
+        else:
+            message_id = self._int(params.get("message_id")) or 0
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": self._method_getme(params),
+        }
+        thread_id = self._int(params.get("message_thread_id"))
+        if thread_id is not None:
+            message["message_thread_id"] = thread_id
+        return message
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _admin(self, user_id: int) -> Dict[str, Any]:
+        return {
+            "status": "administrator",
+            "user": self._user(user_id),
+            "can_be_edited": False,
+            "is_anonymous": False,
+            "can_manage_chat": True,
+            "can_delete_messages": True,
+            "can_manage_video_chats": True,
+            "can_restrict_members": True,
+            "can_promote_members": False,
+            "can_change_info": True,
+            "can_invite_users": True,
+            "can_post_stories": False,
+            "can_edit_stories": False,
+            "can_delete_stories": False,
+        }
+
+    @staticmethod
+    def _int(value: Any) -> Optional[int]:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(status: int, description: str, parameters: Optional[Dict[str, Any]] = None) -> web.Response:
+        body: Dict[str, Any] = {"ok": False, "error_code": status, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=status)
+
+    async def _handle_push_updates(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        updates = payload if isinstance(payload, list) else [payload]
+        ids = [self.push_update(update) for update in updates]
+        return web.json_response({"ok": True, "result": ids})
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+
+async def start_server(api: FakeTelegramAPI, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Запускает сервер и возвращает runner; адрес — f"http://{host}:{port}" (порт 0 — любой свободный)"""
+    runner = web.AppRunner(api.make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def server_url(runner: web.AppRunner) -> str:
+    """Возвращает базовый адрес запущенного сервера для TELEGRAM_API_URL"""
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}"
+
+
+async def serve(api: FakeTelegramAPI, host: str, port: int):
+    runner = await start_server(api, host, port)
+    logger.info(f"Фейковый Bot API слушает {server_url(runner)}")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            logger.info(json.dumps(api.stats(), ensure_ascii=False))
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный фейковый Telegram Bot API для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответе 429, с")
+    parser.add_argument("--kicked-rate", type=float, default=0.0, help="доля чатов, из которых бот «удалён»")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="доля запросов без ответа")
+    parser.add_argument("--timeout-delay", type=float, default=120.0, help="сколько держать такой запрос, с")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    api = FakeTelegramAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        kicked_rate=args.kicked_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_delay=args.timeout_delay,
+        seed=args.seed
+    )
+    try:
+        asyncio.run(serve(api, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Callable, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetChatAdministrators, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, ChatMemberAdministrator, Message, User
+
+
+# Токен в формате Telegram; запросы с ним никуда не уходят
+FAKE_TOKEN = "123456789:AAFakeTokenForBenchmarksOnly000000000"
+
+# chat_id -> ID администраторов, которые вернёт getChatAdministrators
+AdminsProvider = Callable[[int], List[int]]
+
+
+class FakeSession(BaseSession):
+    """Сессия, отвечающая на запросы бота локально с заданной задержкой вместо обращения к Telegram"""
+
+    def __init__(self, latency: float = 0.0, admins: Optional[AdminsProvider] = None):
+        super().__init__()
+        self.latency = latency
+        self.admins = admins or (lambda chat_id: [])
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        # Параметры сериализуются так же, как перед настоящей отправкой
+        self.prepare_value(method.model_dump(warnings=False), bot=bot, files={})
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if isinstance(method, GetChatAdministrators):
+            return [self._admin(user_id) for user_id in self.admins(method.chat_id)]
+
+        if method.__api_method__.startswith("send"):
+            self._message_id += 1
+            return Message(
+                message_id=self._message_id,
+                date=int(time.time()),
+                chat=Chat(id=method.chat_id, type="supergroup")
+            )
+        return True
+
+    @staticmethod
+    def _admin(user_id: int) -> ChatMemberAdministrator:
+        return ChatMemberAdministrator(
+            user=User(id=user_id, is_bot=False, first_name="admin"),
+            can_be_edited=False,
+            is_anonymous=False,
+            can_manage_chat=True,
+            can_delete_messages=True,
+            can_manage_video_chats=True,
+            can_restrict_members=True,
+            can_promote_members=False,
+            can_change_info=True,
+            can_invite_users=True,
+            can_post_stories=False,
+            can_edit_stories=False,
+            can_delete_stories=False
+        )
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self):
+        pass
+
+    @property
+    def sent(self) -> int:
+        """Число успешно «отправленных» сообщений"""
+        return sum(count for name, count in self.calls.items() if name.startswith("send"))
+
+
+def make_bot(latency: float = 0.0, admins: Optional[AdminsProvider] = None) -> Bot:
+    """Создаёт настоящий Bot aiogram поверх FakeSession"""
+    return Bot(FAKE_TOKEN, session=FakeSession(latency, admins))
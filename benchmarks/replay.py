@@ -0,0 +1,449 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+
+from benchmarks.datagen import ADMINS_PER_CHAT, WORDS, admin_ids_for, chat_id_for, chat_index_for, dataset_size, generate
+from benchmarks.fake_bot import make_bot
+from benchmarks.suite import peak_rss_mb, percentile
+from database.database import Database
+from database.fsm_storage import SQLiteStorage
+from handlers.router import setup_routers
+from middlewares.router import setup_middlewares
+from utils.admin_roster import AdminRoster
+from utils.update_filter import UpdatePrefilter
+
+
+RawUpdate = Dict[str, Any]
+
+
+class Timings:
+    """Накопитель длительностей по именам"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, name: str, seconds: float):
+        self.samples[name].append(seconds)
+
+    def summary(self, name: str) -> Dict[str, Any]:
+        values = self.samples.get(name, [])
+        return {
+            "count": len(values),
+            "p50_us": round(percentile(values, 0.5) * 1e6, 1),
+            "p99_us": round(percentile(values, 0.99) * 1e6, 1),
+            "max_us": round(max(values, default=0.0) * 1e6, 1),
+        }
+
+    def total(self, name: str) -> float:
+        return sum(self.samples.get(name, ()))
+
+
+class TimingMiddleware(BaseMiddleware):
+    """Измеряет время всего, что выполняется после него в цепочке middleware и обработчика"""
+
+    def __init__(self, timings: Timings, name: str):
+        self.timings = timings
+        self.name = name
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.timings.add(self.name, time.perf_counter() - started)
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Приблизительный объём памяти объекта вместе со всем, на что он ссылается"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def current_rss_mb() -> float:
+    """Текущий объём резидентной памяти (Linux), иначе пиковый"""
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+class UpdateFactory:
+    """Собирает сырые обновления Telegram, как они приходят в getUpdates или вебхук"""
+
+    def __init__(self):
+        self._update_id = 0
+        self._message_id = 0
+
+    def _next_ids(self):
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    @staticmethod
+    def _chat(chat_id: int) -> Dict[str, Any]:
+        if chat_id > 0:
+            return {"id": chat_id, "type": "private", "first_name": "user"}
+        return {"id": chat_id, "type": "supergroup", "title": "bench"}
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def message(self, chat_id: int, user_id: int, text: Optional[str] = None, **fields: Any) -> RawUpdate:
+        update_id, message_id = self._next_ids()
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": self._chat(chat_id),
+            "from": self._user(user_id),
+            **fields,
+        }
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return {"update_id": update_id, "message": message}
+
+    def photo(self, chat_id: int, user_id: int) -> RawUpdate:
+        file_id = f"AgACAgIAAx{self._message_id:x}"
+        photo = [{"file_id": file_id, "file_unique_id": file_id[-8:], "width": 1280, "height": 720}]
+        return self.message(chat_id, user_id, photo=photo)
+
+    def callback(self, chat_id: int, user_id: int, data: str) -> RawUpdate:
+        update_id, message_id = self._next_ids()
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": self._chat(chat_id),
+                    "text": "⚙️ Настройки рекламных сообщений",
+                },
+            },
+        }
+
+
+def ad_creation_flow(factory: UpdateFactory, rng: random.Random, chat_id: int, user_id: int) -> Iterable[RawUpdate]:
+    """Полный сценарий создания объявления администратором — от /reklama_settings до подтверждения"""
+    yield factory.message(chat_id, user_id, "/reklama_settings")
+    yield factory.callback(chat_id, user_id, "add_ad")
+    yield factory.message(chat_id, user_id, " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 30))))
+
+    if rng.random() < 0.3:
+        yield factory.callback(chat_id, user_id, "media_type:photo")
+        yield factory.photo(chat_id, user_id)
+    else:
+        yield factory.callback(chat_id, user_id, "media_type:none")
+
+    if rng.random() < 0.5:
+        yield factory.callback(chat_id, user_id, "need_button:yes")
+        yield factory.message(chat_id, user_id, "Подробнее")
+        yield factory.message(chat_id, user_id, f"https://example.com/{rng.getrandbits(32):x}")
+    else:
+        yield factory.callback(chat_id, user_id, "need_button:no")
+
+    if rng.random() < 0.2:
+        yield factory.callback(chat_id, user_id, "need_topic:yes")
+        yield factory.message(chat_id, user_id, str(rng.randint(1, 50)))
+    else:
+        yield factory.callback(chat_id, user_id, "need_topic:no")
+
+    if rng.random() < 0.2:
+        yield factory.callback(chat_id, user_id, "interval:custom")
+        yield factory.message(chat_id, user_id, str(rng.randint(5, 1440)))
+    else:
+        yield factory.callback(chat_id, user_id, f"interval:{rng.choice((30, 60, 120))}")
+
+    yield factory.callback(chat_id, user_id, "duration:1440")
+    yield factory.callback(chat_id, user_id, "confirm_ad:yes")
+
+
+class Replay:
+    """Прогоняет обновления через Dispatcher с роутерами и middleware бота"""
+
+    def __init__(
+        self,
+        db: Database,
+        bot: Bot,
+        storage: SQLiteStorage,
+        prefilter: bool = False,
+        concurrency: int = 64
+    ):
+        self.db = db
+        self.bot = bot
+        self.storage = storage
+        self.timings = Timings()
+        self.prefilter = UpdatePrefilter(storage.has_state) if prefilter else None
+        self.concurrency = concurrency
+        self.processed = 0
+        self.errors = 0
+        self.memory: List[Dict[str, Any]] = []
+
+        # Внешний замер стоит до AdminCheckMiddleware, внутренний — после него, вплотную
+        # к обработчику; разница между ними — время проверки прав
+        dp = Dispatcher(storage=storage)
+        dp["db"] = db
+        dp["bot"] = bot
+        dp["admin_roster"] = AdminRoster()
+        for observer in (dp.message, dp.callback_query):
+            observer.middleware(TimingMiddleware(self.timings, "middleware_and_handler"))
+        setup_middlewares(dp, db, dp["admin_roster"])
+        for observer in (dp.message, dp.callback_query):
+            observer.middleware(TimingMiddleware(self.timings, "handler"))
+        dp.include_router(setup_routers())
+        self.dp = dp
+
+    async def feed(self, kind: str, update: RawUpdate):
+        started = time.perf_counter()
+        try:
+            # Как в WebhookRequestHandler: лишние обновления отбрасываются до разбора
+            if self.prefilter is not None and not self.prefilter.is_relevant(self.bot.id, update):
+                self.prefilter.dropped += 1
+            else:
+                await self.dp.feed_raw_update(self.bot, update)
+        except Exception:
+            self.errors += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            self.timings.add(kind, elapsed)
+            self.timings.add("update", elapsed)
+            self.processed += 1
+
+    async def feed_sequence(self, kind: str, updates: Iterable[RawUpdate]):
+        """Подаёт обновления по одному, дожидаясь обработки каждого (как действия одного пользователя)"""
+        for update in updates:
+            await self.feed(kind, update)
+
+    async def feed_concurrently(self, kind: str, updates: Iterable[RawUpdate]):
+        """Подаёт обновления не более чем по concurrency одновременно (как вебхук)"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for update in updates:
+            queue.put_nowait(update)
+
+        async def worker():
+            while not queue.empty():
+                await self.feed(kind, queue.get_nowait())
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    def sample_memory(self, started: float):
+        cache = self.storage.cache
+        self.memory.append({
+            "t": round(time.perf_counter() - started, 2),
+            "updates": self.processed,
+            "fsm_cached": len(cache),
+            "fsm_active": len(self.storage._active),
+            "fsm_kb": round(deep_sizeof((cache, self.storage._stored, self.storage._active)) / 1024, 1),
+            "rss_mb": current_rss_mb(),
+        })
+
+    async def sample_memory_every(self, interval: float, started: float):
+        while True:
+            self.sample_memory(started)
+            await asyncio.sleep(interval)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Доли времени: разбор и маршрутизация, проверка прав, обработчики"""
+        total = self.timings.total("update")
+        stack = self.timings.total("middleware_and_handler")
+        handler = self.timings.total("handler")
+        parts = {
+            "dispatch": total - stack,
+            "admin_check": stack - handler,
+            "handler": handler,
+        }
+        updates = max(1, self.processed)
+        return {
+            name: {
+                "mean_us": round(seconds / updates * 1e6, 1),
+                "share": round(seconds / total, 3) if total else 0.0,
+            }
+            for name, seconds in parts.items()
+        }
+
+
+def count_rows(path: str, table: str) -> int:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def load_updates(path: str) -> List[RawUpdate]:
+    """Читает записанные обновления: по одному JSON-объекту в строке"""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+async def run(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    chats, ads_before = dataset_size(db_path)
+    rng = random.Random(args.seed)
+    factory = UpdateFactory()
+
+    # Обработчики создают объявления и меняют настройки, поэтому работаем с копией
+    workdir = tempfile.mkdtemp(prefix="reklama-replay-")
+    path = os.path.join(workdir, "reklama.db")
+    shutil.copyfile(db_path, path)
+
+    db = Database(path)
+    bot = make_bot(
+        args.latency,
+        admins=lambda chat_id: admin_ids_for(chat_index_for(chat_id), ADMINS_PER_CHAT)
+    )
+    storage = SQLiteStorage(db)
+    try:
+        await db.create_tables()
+        await db.warm_chat_settings_cache()
+        await storage.start()
+        replay = Replay(db, bot, storage, args.prefilter, args.concurrency)
+
+        jobs = []
+        if args.replay:
+            jobs.append(replay.feed_concurrently("recorded", load_updates(args.replay)))
+        else:
+            for index in range(args.admins):
+                chat_index = index % chats
+                user_id = admin_ids_for(chat_index, ADMINS_PER_CHAT)[index // chats % ADMINS_PER_CHAT]
+                flows = [
+                    update
+                    for _ in range(args.flows)
+                    for update in ad_creation_flow(factory, rng, chat_id_for(chat_index), user_id)
+                ]
+                jobs.append(replay.feed_sequence("ad_creation", flows))
+
+            chatter = []
+            for _ in range(args.chatter):
+                chat_index = rng.randrange(chats)
+                if rng.random() < args.settings_ratio:
+                    user_id = rng.choice(
+                        admin_ids_for(chat_index, ADMINS_PER_CHAT) + [rng.randint(1, 999_999)]
+                    )
+                    chatter.append(("settings", factory.message(chat_id_for(chat_index), user_id, "/reklama_settings")))
+                else:
+                    text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+                    chatter.append(("chatter", factory.message(chat_id_for(chat_index), rng.randint(1, 999_999), text)))
+            for kind in ("chatter", "settings"):
+                jobs.append(replay.feed_concurrently(kind, [update for name, update in chatter if name == kind]))
+
+        started = time.perf_counter()
+        sampler = asyncio.create_task(replay.sample_memory_every(args.sample_interval, started))
+        try:
+            await asyncio.gather(*jobs)
+        finally:
+            sampler.cancel()
+        elapsed = time.perf_counter() - started
+        replay.sample_memory(started)
+        fsm_rows = count_rows(path, "fsm_states")
+        ads_created = count_rows(path, "advertisements") - ads_before
+    finally:
+        await storage.close()
+        await bot.session.close()
+        await db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    kinds = [kind for kind in ("ad_creation", "settings", "chatter", "recorded") if kind in replay.timings.samples]
+    return {
+        "meta": {
+            "chats": chats,
+            "admins": args.admins,
+            "flows": args.flows,
+            "chatter": args.chatter,
+            "settings_ratio": args.settings_ratio,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "prefilter": args.prefilter,
+            "replay": args.replay,
+        },
+        "results": {
+            "updates": replay.processed,
+            "errors": replay.errors,
+            "elapsed_s": round(elapsed, 2),
+            "updates_per_sec": round(replay.processed / elapsed, 1) if elapsed else 0.0,
+            "latency": {kind: replay.timings.summary(kind) for kind in ["update"] + kinds},
+            "breakdown": replay.breakdown(),
+            "prefilter_dropped": replay.prefilter.dropped if replay.prefilter else 0,
+            "ads_created": ads_created,
+            "fsm_rows": fsm_rows,
+            "queries": db.query_count,
+            "api_calls": dict(bot.session.calls),
+            "memory": replay.memory,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогон обновлений через Dispatcher бота")
+    parser.add_argument("--db", help="готовый набор данных (python -m benchmarks.datagen)")
+    parser.add_argument("--chats", type=int, default=1000, help="размер набора, если --db не задан")
+    parser.add_argument("--ads", type=int, default=10000, help="размер набора, если --db не задан")
+    parser.add_argument("--replay", help="записанные обновления, по JSON-объекту в строке")
+    parser.add_argument("--admins", type=int, default=200, help="администраторов, одновременно создающих объявления")
+    parser.add_argument("--flows", type=int, default=3, help="объявлений на администратора")
+    parser.add_argument("--chatter", type=int, default=20000, help="сообщений в группах")
+    parser.add_argument("--settings-ratio", type=float, default=0.05, help="доля /reklama_settings среди них")
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременно обрабатываемых сообщений групп")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа фейкового Telegram, с")
+    parser.add_argument("--prefilter", action="store_true", help="отбрасывать лишнее через UpdatePrefilter")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="период замера памяти, с")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="записать результаты в JSON-файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory(prefix="reklama-replay-") as workdir:
+        db_path = args.db
+        if db_path is None:
+            db_path = os.path.join(workdir, "reklama.db")
+            generate(db_path, args.chats, args.ads)
+        results = asyncio.run(run(args, db_path))
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            file.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Sequence
+from unittest import mock
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from benchmarks.datagen import ADMINS_PER_CHAT, admin_ids_for, chat_id_for, dataset_start
+from database.database import Database
+from middlewares.admin_check import AdminCheckMiddleware
+from utils import scheduler as scheduler_module
+from utils.admin_roster import AdminRoster
+from utils.scheduler import AdvertisementScheduler
+
+
+Result = Dict[str, Any]
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Возвращает перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Пиковый объём резидентной памяти процесса (ru_maxrss в Linux — в килобайтах)"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class VirtualClock:
+    """Подменяет модуль time в планировщике: time() стоит на месте, пока его не сдвинут"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(time, name)
+
+
+async def bench_scheduler_tick(
+    db_path: str,
+    bot: Bot,
+    sent_count: Callable[[], int],
+    ticks: int = 20,
+    tick_seconds: int = 60,
+    concurrency: int = 16
+) -> Result:
+    """Прогоняет ticks рассылок планировщика, сдвигая виртуальные часы на tick_seconds.
+
+    sent_count возвращает число сообщений, принятых фейковым Telegram с начала работы.
+    """
+    # Рассылка меняет расписание в базе, поэтому работаем с копией набора данных
+    workdir = tempfile.mkdtemp(prefix="reklama-bench-")
+    path = os.path.join(workdir, "reklama.db")
+    shutil.copyfile(db_path, path)
+
+    db = Database(path)
+    try:
+        await db.create_tables()
+        # Часы начинаются с момента генерации: расписание распределено по интервалам,
+        # и каждая рассылка отправляет примерно ту долю объявлений, что и в работе
+        clock = VirtualClock(dataset_start(path))
+
+        with mock.patch.object(scheduler_module, "time", clock):
+            scheduler = AdvertisementScheduler(bot, db, concurrency=concurrency)
+            await scheduler._load_schedule()
+
+            durations: List[float] = []
+            queries: List[int] = []
+            sends: List[int] = []
+            for _ in range(ticks + 1):
+                clock.now += tick_seconds
+                queries_before = db.query_count
+                sent_before = sent_count()
+
+                started = time.perf_counter()
+                await scheduler._check_and_send_ads()
+                durations.append(time.perf_counter() - started)
+
+                if scheduler._refresh_tasks:
+                    await asyncio.gather(*scheduler._refresh_tasks)
+                queries.append(db.query_count - queries_before)
+                sends.append(sent_count() - sent_before)
+    finally:
+        await db.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Первая рассылка идёт с холодным кэшем объявлений и считается отдельно
+    cold_ms, durations, queries, sends = durations[0] * 1000, durations[1:], queries[1:], sends[1:]
+    total_time = sum(durations)
+    return {
+        "ticks": ticks,
+        "cold_ms": round(cold_ms, 2),
+        "p50_ms": round(percentile(durations, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+        "queries_per_tick": round(sum(queries) / len(queries), 2),
+        "sends_per_tick": round(sum(sends) / len(sends), 1),
+        "sends_per_sec": round(sum(sends) / total_time, 1) if total_time else 0.0,
+    }
+
+
+async def bench_active_ads(db_path: str, repeat: int = 5) -> Result:
+    """Измеряет полную выборку активных объявлений get_active_advertisements"""
+    db = Database(db_path)
+    try:
+        current_time = dataset_start(db_path)
+        durations: List[float] = []
+        rows = 0
+        queries_before = db.query_count
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = len(await db.get_active_advertisements(current_time))
+            durations.append(time.perf_counter() - started)
+        queries = db.query_count - queries_before
+    finally:
+        await db.close()
+
+    return {
+        "rows": rows,
+        "p50_ms": round(percentile(durations, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+        "queries_per_call": round(queries / repeat, 2),
+    }
+
+
+def _group_message(index: int, chat_id: int, user_id: int) -> Message:
+    return Message.model_validate({
+        "message_id": index,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup", "title": "bench"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+        "text": "/settings",
+    })
+
+
+async def bench_admin_check(
+    db_path: str,
+    bot: Bot,
+    chats: int,
+    events: int = 5000,
+    admin_ratio: float = 0.8,
+    admins_per_chat: int = ADMINS_PER_CHAT,
+    seed: int = 1
+) -> Result:
+    """Прогоняет сообщения из групп через AdminCheckMiddleware (администраторы и обычные пользователи).
+
+    Фейковый Telegram бота должен отдавать администраторов чатов по admin_ids_for.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for index in range(events):
+        chat_index = rng.randrange(chats)
+        if rng.random() < admin_ratio:
+            user_id = rng.choice(admin_ids_for(chat_index, admins_per_chat))
+        else:
+            user_id = rng.randint(1, 999_999)
+        messages.append(_group_message(index, chat_id_for(chat_index), user_id))
+
+    db = Database(db_path)
+    middleware = AdminCheckMiddleware(db, AdminRoster())
+
+    async def handler(event: Message, data: Dict[str, Any]):
+        return data["is_admin"]
+
+    try:
+        await db.warm_chat_settings_cache()
+        durations: List[float] = []
+        queries_before = db.query_count
+        for message in messages:
+            started = time.perf_counter()
+            await middleware(handler, message, {"bot": bot})
+            durations.append(time.perf_counter() - started)
+        queries = db.query_count - queries_before
+        roster_chats = len(middleware.admin_roster.cache)
+    finally:
+        await db.close()
+
+    return {
+        "events": events,
+        "p50_us": round(percentile(durations, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(durations, 0.99) * 1e6, 1),
+        "queries_per_call": round(queries / events, 3),
+        "roster_cached_chats": roster_chats,
+    }
@@ -1,16 +1,72 @@
 import os
 from dataclasses import dataclass
+from typing import Tuple
 
 @dataclass
 class Config:
     BOT_TOKEN: str = ""
+    # Адрес Bot API; пусто — api.telegram.org (например, http://127.0.0.1:8081 для benchmarks.fake_api)
+    TELEGRAM_API_URL: str = ""
+    PREFILTER_UPDATES: bool = True
+    
+    # "polling" или "webhook"
+    RUN_MODE: str = "polling"
+    WEBHOOK_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    # Пусто — случайный секрет на время работы бота
+    WEBHOOK_SECRET: str = ""
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_MAX_CONCURRENCY: int = 64
+    WEBHOOK_MAX_CONNECTIONS: int = 40
+    
+    # Метрики Prometheus на http://METRICS_HOST:METRICS_PORT/metrics
+    METRICS_ENABLED: bool = True
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9101
     
     DB_PATH: str = "database/reklama.db"
+    DB_CACHE_SIZE_KB: int = 65536
+    DB_MMAP_SIZE: int = 268435456
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    
+    # Профилирование запросов и методов Database (команда /db_top)
+    DB_PROFILE: bool = False
+    # Запросы дольше порога пишутся в журнал с параметрами и планом; 0 — не писать
+    DB_SLOW_QUERY_MS: int = 100
+    # Файл журнала медленных запросов; пусто — только общий лог
+    DB_SLOW_QUERY_LOG: str = ""
+    DB_SLOW_QUERY_HISTORY: int = 50
+    
+    # Пользователи, которым доступны отладочные команды в личных сообщениях
+    DEBUG_USER_IDS: Tuple[int, ...] = ()
+    
+    CHAT_SETTINGS_CACHE_SIZE: int = 10000
+    CHAT_SETTINGS_CACHE_TTL: int = 300
+    
+    AD_CACHE_SIZE: int = 10000
+    AD_CACHE_TTL: int = 600
+    
+    ADMIN_ROSTER_TTL: int = 600
+    ADMIN_ROSTER_CACHE_SIZE: int = 10000
+    
+    FSM_TTL: int = 86400
+    FSM_CACHE_SIZE: int = 10000
+    FSM_SWEEP_INTERVAL: int = 600
     
     MIN_INTERVAL: int = 5
     MAX_INTERVAL: int = 1440 
     
     MIN_DURATION: int = 5
     MAX_DURATION: int = 10080  
+    
+    SCHEDULER_RESYNC_INTERVAL: int = 3600
+    SCHEDULER_CONCURRENCY: int = 16
+    SCHEDULER_FLUSH_SIZE: int = 500
+    
+    RATE_LIMIT_GLOBAL_PER_SECOND: float = 30
+    RATE_LIMIT_GROUP_PER_MINUTE: float = 20
+    RATE_LIMIT_PRIVATE_PER_SECOND: float = 1
+    RATE_LIMIT_CHAT_BURST: float = 3
 
 config = Config() 
\ No newline at end of file
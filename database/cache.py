@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+# Признак отсутствия записи в кэше (None хранится как «известно, что записи нет в базе»)
+MISSING = object()
+
+
+class LRUCache:
+    """Кэш ограниченного размера с вытеснением давно неиспользуемых записей и временем жизни"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Возвращает значение по ключу или MISSING, если записи нет или она устарела"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Any:
+        """Возвращает значение как get, но не учитывает обращение в статистике и порядке вытеснения"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return MISSING
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Сохраняет значение, вытесняя самые старые записи при переполнении"""
+        if self.maxsize <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Удаляет запись из кэша"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,98 +1,321 @@
 import aiosqlite
+import asyncio
+import dataclasses
 import json
+import logging
 import time
-from typing import List, Optional, Dict, Any, Tuple, Union
+from typing import List, Optional, Dict, Any, Set, Tuple, Union, Sequence, Callable
 import os
 
 from config import config
-from database.models import Advertisement, ChatSettings, InlineButton
+from database.cache import LRUCache, MISSING
+from database.migrations import apply_migrations
+from database.models import (
+    AdSearch,
+    Advertisement,
+    AdvertisementPreview,
+    AdvertisementRecord,
+    ChatSettings,
+    InlineButton
+)
+from database.profiler import QueryProfiler, caller_method, current_method, profile_methods
+from utils import metrics
 
 
+logger = logging.getLogger(__name__)
+
+# Виды изменений, о которых Database сообщает подписчикам (см. add_change_listener)
+CHANGE_AD = "ad"
+CHANGE_CHAT = "chat"
+
+ChangeListener = Callable[[str, int], None]
+
+# Столбцы объявления в порядке, который ожидает _decode_advertisement
+AD_COLUMNS = (
+    "id, chat_id, text, media_type, media_file_id, topic_id, button_text, button_url, "
+    "interval_minutes, duration_minutes, is_active, created_at, last_sent_at, next_due_at, expires_at"
+)
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT_MS}",
+    f"PRAGMA mmap_size = {config.DB_MMAP_SIZE}",
+    f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB}",
+)
+
+
+@metrics.instrument_methods(metrics.DB_METHOD_SECONDS)
+@profile_methods(exclude=("connect", "close", "explain"))
 class Database:
     def __init__(self, db_path: str = config.DB_PATH):
         self.db_path = db_path
+        self._connection: Optional[aiosqlite.Connection] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self.schema_version = 0
+        self.fts_enabled = False
+        self._change_listeners: List[ChangeListener] = []
+        self.query_count = 0
+        self.profiler = QueryProfiler()
+        self.chat_settings_cache = LRUCache(
+            config.CHAT_SETTINGS_CACHE_SIZE,
+            config.CHAT_SETTINGS_CACHE_TTL
+        )
+        self.ad_cache = LRUCache(config.AD_CACHE_SIZE, config.AD_CACHE_TTL)
+    
+    async def connect(self) -> aiosqlite.Connection:
+        """Открывает постоянное соединение с базой данных (один раз за время работы бота)"""
+        if self._connection is not None:
+            return self._connection
+            
+        async with self._connect_lock:
+            if self._connection is None:
+                directory = os.path.dirname(self.db_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    
+                connection = await aiosqlite.connect(self.db_path)
+                connection.row_factory = aiosqlite.Row
+                for pragma in PRAGMAS:
+                    cursor = await connection.execute(pragma)
+                    await cursor.close()
+                self._connection = connection
+                
+        return self._connection
+    
+    async def close(self):
+        """Закрывает соединение с базой данных"""
+        if self._connection is None:
+            return
+            
+        connection, self._connection = self._connection, None
+        await connection.close()
+    
+    def add_change_listener(self, listener: ChangeListener):
+        """Подписывает обработчик на изменения объявлений и настроек чатов"""
+        self._change_listeners.append(listener)
+    
+    def remove_change_listener(self, listener: ChangeListener):
+        """Отписывает обработчик от изменений"""
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+    
+    def _notify(self, kind: str, object_id: int):
+        """Сообщает подписчикам об изменении объявления или настроек чата"""
+        for listener in self._change_listeners:
+            try:
+                listener(kind, object_id)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике изменений базы данных: {e}", exc_info=True)
+    
+    async def _fetchone(self, query: str, params: Sequence = ()) -> Optional[aiosqlite.Row]:
+        """Выполняет запрос и возвращает первую строку результата"""
+        acquire_started = time.perf_counter()
+        connection = await self.connect()
+        started = time.perf_counter()
+        self.query_count += 1
+        async with connection.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+        await self._profile(query, params, started, int(row is not None), started - acquire_started)
+        return row
+    
+    async def _fetchall(self, query: str, params: Sequence = ()) -> List[aiosqlite.Row]:
+        """Выполняет запрос и возвращает все строки результата"""
+        acquire_started = time.perf_counter()
+        connection = await self.connect()
+        started = time.perf_counter()
+        self.query_count += 1
+        async with connection.execute(query, params) as cursor:
+            rows = list(await cursor.fetchall())
+        await self._profile(query, params, started, len(rows), started - acquire_started)
+        return rows
+    
+    async def _fetchall_tuples(self, query: str, params: Sequence = ()) -> List[tuple]:
+        """Выполняет запрос и возвращает строки результата обычными кортежами (без aiosqlite.Row)"""
+        acquire_started = time.perf_counter()
+        connection = await self.connect()
+        started = time.perf_counter()
+        self.query_count += 1
+        async with connection.execute(query, params) as cursor:
+            cursor.row_factory = None
+            rows = await cursor.fetchall()
+        await self._profile(query, params, started, len(rows), started - acquire_started)
+        return rows
+    
+    async def _execute(self, query: str, params: Sequence = ()) -> aiosqlite.Cursor:
+        """Выполняет изменяющий запрос и фиксирует транзакцию"""
+        acquire_started = time.perf_counter()
+        connection = await self.connect()
+        self.query_count += 1
+        async with self._write_lock:
+            # Ожидание блокировки записи считается временем получения соединения
+            started = time.perf_counter()
+            cursor = await connection.execute(query, params)
+            await connection.commit()
+        await cursor.close()
+        await self._profile(query, params, started, max(cursor.rowcount, 0), started - acquire_started)
+        return cursor
+    
+    async def _executemany(self, query: str, params_seq: Sequence[Sequence]):
+        """Выполняет изменяющий запрос для набора параметров одной транзакцией"""
+        acquire_started = time.perf_counter()
+        connection = await self.connect()
+        self.query_count += 1
+        async with self._write_lock:
+            started = time.perf_counter()
+            cursor = await connection.executemany(query, params_seq)
+            await connection.commit()
+        await cursor.close()
+        # В статистику и журнал попадает первый набор параметров: по нему снимается план
+        await self._profile(
+            query, params_seq[0] if params_seq else (), started,
+            max(cursor.rowcount, 0), started - acquire_started
+        )
+    
+    async def _profile(self, query: str, params: Sequence, started: float, rows: int, acquire: float):
+        """Передаёт выполненный запрос профилировщику и пишет его в журнал, если он медленный"""
+        elapsed = time.perf_counter() - started
+        if not self.profiler.record(query, params, elapsed, rows, acquire):
+            return
+            
+        plan = self.profiler.plans.get(query)
+        if plan is None:
+            plan = await self.explain(query, params)
+            self.profiler.plans[query] = plan
+        method = current_method.get() or caller_method(self)
+        self.profiler.log_slow(query, params, elapsed, rows, plan, method)
+    
+    async def explain(self, query: str, params: Sequence = ()) -> List[str]:
+        """Возвращает EXPLAIN QUERY PLAN запроса строками с отступами по вложенности"""
+        connection = await self.connect()
+        try:
+            async with connection.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+                cursor.row_factory = None
+                rows = await cursor.fetchall()
+        except (aiosqlite.Error, ValueError) as e:
+            return [f"план недоступен: {e}"]
+            
+        depth: Dict[int, int] = {0: 0}
+        plan = []
+        for node_id, parent_id, _, detail in rows:
+            depth[node_id] = depth.get(parent_id, 0) + 1
+            plan.append("  " * (depth[node_id] - 1) + detail)
+        return plan
         
     async def create_tables(self):
-        """Создаёт таблицы в базе данных, если они не существуют"""
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        """Открывает соединение, создаёт таблицы и применяет миграции схемы"""
+        db = await self.connect()
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS chat_settings (
-                    chat_id INTEGER PRIMARY KEY,
-                    is_enabled INTEGER DEFAULT 1,
-                    admin_ids TEXT DEFAULT '[]'
-                )
-            """)
-            
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS advertisements (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id INTEGER NOT NULL,
-                    text TEXT NOT NULL,
-                    media_type TEXT,
-                    media_file_id TEXT,
-                    topic_id INTEGER,
-                    button_text TEXT,
-                    button_url TEXT,
-                    interval_minutes INTEGER DEFAULT 60,
-                    duration_minutes INTEGER DEFAULT 1440,
-                    is_active INTEGER DEFAULT 1,
-                    created_at INTEGER,
-                    last_sent_at INTEGER,
-                    FOREIGN KEY (chat_id) REFERENCES chat_settings (chat_id) ON DELETE CASCADE
-                )
-            """)
+        async with self._write_lock:
+            self.schema_version = await apply_migrations(db)
             
-            await db.commit()
+        row = await self._fetchone("SELECT 1 FROM sqlite_master WHERE name = 'ads_fts'")
+        self.fts_enabled = row is not None
     
     
+    async def warm_chat_settings_cache(self) -> int:
+        """Заполняет кэш настроек чатов при запуске и возвращает число загруженных записей"""
+        rows = await self._fetchall(
+            "SELECT * FROM chat_settings LIMIT ?",
+            (self.chat_settings_cache.maxsize,)
+        )
+        admin_rows = await self._fetchall(
+            """
+            SELECT chat_id, user_id FROM chat_admins
+            WHERE chat_id IN (SELECT chat_id FROM chat_settings LIMIT ?)
+            """,
+            (self.chat_settings_cache.maxsize,)
+        )
+        
+        admins: Dict[int, Set[int]] = {}
+        for admin_row in admin_rows:
+            admins.setdefault(admin_row['chat_id'], set()).add(admin_row['user_id'])
+            
+        for row in rows:
+            settings = self._row_to_chat_settings(row, admins.get(row['chat_id'], set()))
+            self.chat_settings_cache.set(row['chat_id'], settings)
+        return len(rows)
+    
     async def get_chat_settings(self, chat_id: int) -> Optional[ChatSettings]:
-        """Получает настройки чата из базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM chat_settings WHERE chat_id = ?", 
-                (chat_id,)
-            )
-            row = await cursor.fetchone()
+        """Получает настройки чата из кэша или из базы данных"""
+        cached = self.chat_settings_cache.get(chat_id)
+        if cached is not MISSING:
+            return self._copy_chat_settings(cached)
             
-            if not row:
-                return None
-                
-            admin_ids = json.loads(row['admin_ids'])
-            return ChatSettings(
-                chat_id=row['chat_id'],
-                is_enabled=bool(row['is_enabled']),
-                admin_ids=admin_ids
+        row = await self._fetchone(
+            "SELECT * FROM chat_settings WHERE chat_id = ?", 
+            (chat_id,)
+        )
+        
+        settings = None
+        if row:
+            admin_rows = await self._fetchall(
+                "SELECT user_id FROM chat_admins WHERE chat_id = ?",
+                (chat_id,)
             )
+            settings = self._row_to_chat_settings(row, {admin_row[0] for admin_row in admin_rows})
+        self.chat_settings_cache.set(chat_id, settings)
+        return self._copy_chat_settings(settings)
     
     async def save_chat_settings(self, settings: ChatSettings):
-        """Сохраняет настройки чата в базу данных"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                INSERT INTO chat_settings (chat_id, is_enabled, admin_ids) 
-                VALUES (?, ?, ?)
-                ON CONFLICT (chat_id) DO UPDATE SET
-                    is_enabled = ?,
-                    admin_ids = ?
-                """,
-                (
-                    settings.chat_id, 
-                    int(settings.is_enabled), 
-                    json.dumps(settings.admin_ids or []),
-                    int(settings.is_enabled),
-                    json.dumps(settings.admin_ids or [])
-                )
+        """Сохраняет настройки чата в базу данных.
+        
+        Администраторы из settings.admin_ids добавляются к уже сохранённым;
+        удаляются они только через remove_chat_admin.
+        """
+        admin_ids = set(settings.admin_ids or ())
+        await self._execute(
+            """
+            INSERT INTO chat_settings (chat_id, is_enabled) VALUES (?, ?)
+            ON CONFLICT (chat_id) DO UPDATE SET is_enabled = excluded.is_enabled
+            """,
+            (settings.chat_id, int(settings.is_enabled))
+        )
+        if admin_ids:
+            await self._executemany(
+                "INSERT OR IGNORE INTO chat_admins (chat_id, user_id) VALUES (?, ?)",
+                [(settings.chat_id, user_id) for user_id in admin_ids]
             )
-            await db.commit()
+            
+        cached = self.chat_settings_cache.peek(settings.chat_id)
+        if cached is not MISSING and cached is not None:
+            admin_ids |= cached.admin_ids
+        self.chat_settings_cache.set(
+            settings.chat_id,
+            dataclasses.replace(settings, admin_ids=admin_ids)
+        )
+        self._notify(CHANGE_CHAT, settings.chat_id)
             
     async def delete_chat_settings(self, chat_id: int):
         """Удаляет настройки чата из базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("DELETE FROM chat_settings WHERE chat_id = ?", (chat_id,))
-            await db.commit()
+        await self._execute("DELETE FROM chat_admins WHERE chat_id = ?", (chat_id,))
+        await self._execute("DELETE FROM chat_settings WHERE chat_id = ?", (chat_id,))
+        self.chat_settings_cache.set(chat_id, None)
+        self._notify(CHANGE_CHAT, chat_id)
+    
+    async def add_chat_admin(self, chat_id: int, user_id: int) -> bool:
+        """Добавляет администратора бота в чате; возвращает False, если он уже был добавлен"""
+        cursor = await self._execute(
+            "INSERT OR IGNORE INTO chat_admins (chat_id, user_id) VALUES (?, ?)",
+            (chat_id, user_id)
+        )
+        cached = self.chat_settings_cache.peek(chat_id)
+        if cached is not MISSING and cached is not None:
+            cached.admin_ids.add(user_id)
+        return cursor.rowcount > 0
+    
+    async def remove_chat_admin(self, chat_id: int, user_id: int) -> bool:
+        """Удаляет администратора бота в чате; возвращает False, если его не было"""
+        cursor = await self._execute(
+            "DELETE FROM chat_admins WHERE chat_id = ? AND user_id = ?",
+            (chat_id, user_id)
+        )
+        cached = self.chat_settings_cache.peek(chat_id)
+        if cached is not MISSING and cached is not None:
+            cached.admin_ids.discard(user_id)
+        return cursor.rowcount > 0
     
     
     async def add_advertisement(self, ad: Advertisement) -> int:
@@ -101,29 +324,32 @@ class Database:
         if ad.created_at is None:
             ad.created_at = current_time
             
+        ad.next_due_at, ad.expires_at = self._schedule_times(ad)
+            
         button_text = None
         button_url = None
         if ad.button:
             button_text = ad.button.text
             button_url = ad.button.url
             
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                """
-                INSERT INTO advertisements (
-                    chat_id, text, media_type, media_file_id, topic_id,
-                    button_text, button_url, interval_minutes, duration_minutes,
-                    is_active, created_at, last_sent_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    ad.chat_id, ad.text, ad.media_type, ad.media_file_id, ad.topic_id,
-                    button_text, button_url, ad.interval_minutes, ad.duration_minutes,
-                    int(ad.is_active), ad.created_at, ad.last_sent_at
-                )
+        cursor = await self._execute(
+            """
+            INSERT INTO advertisements (
+                chat_id, text, media_type, media_file_id, topic_id,
+                button_text, button_url, interval_minutes, duration_minutes,
+                is_active, created_at, last_sent_at, next_due_at, expires_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                ad.chat_id, ad.text, ad.media_type, ad.media_file_id, ad.topic_id,
+                button_text, button_url, ad.interval_minutes, ad.duration_minutes,
+                int(ad.is_active), ad.created_at, ad.last_sent_at,
+                ad.next_due_at, ad.expires_at
             )
-            await db.commit()
-            return cursor.lastrowid
+        )
+        self.ad_cache.invalidate(cursor.lastrowid)
+        self._notify(CHANGE_AD, cursor.lastrowid)
+        return cursor.lastrowid
     
     async def update_advertisement(self, ad: Advertisement) -> bool:
         """Обновляет существующее рекламное объявление в базе данных"""
@@ -136,212 +362,391 @@ class Database:
             button_text = ad.button.text
             button_url = ad.button.url
         
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                """
-                UPDATE advertisements SET
-                    text = ?, media_type = ?, media_file_id = ?, topic_id = ?,
-                    button_text = ?, button_url = ?, interval_minutes = ?,
-                    duration_minutes = ?, is_active = ?, last_sent_at = ?
-                WHERE id = ? AND chat_id = ?
-                """,
-                (
-                    ad.text, ad.media_type, ad.media_file_id, ad.topic_id,
-                    button_text, button_url, ad.interval_minutes, ad.duration_minutes,
-                    int(ad.is_active), ad.last_sent_at, ad.id, ad.chat_id
-                )
+        await self._execute(
+            """
+            UPDATE advertisements SET
+                text = ?, media_type = ?, media_file_id = ?, topic_id = ?,
+                button_text = ?, button_url = ?, interval_minutes = ?,
+                duration_minutes = ?, is_active = ?, last_sent_at = ?,
+                next_due_at = CASE WHEN COALESCE(? + ? * 60, created_at) <= created_at + ? * 60
+                    THEN COALESCE(? + ? * 60, created_at) END,
+                expires_at = created_at + ? * 60
+            WHERE id = ? AND chat_id = ?
+            """,
+            (
+                ad.text, ad.media_type, ad.media_file_id, ad.topic_id,
+                button_text, button_url, ad.interval_minutes, ad.duration_minutes,
+                int(ad.is_active), ad.last_sent_at,
+                ad.last_sent_at, ad.interval_minutes, ad.duration_minutes,
+                ad.last_sent_at, ad.interval_minutes, ad.duration_minutes,
+                ad.id, ad.chat_id
             )
-            await db.commit()
-            return True
+        )
+        self.ad_cache.invalidate(ad.id)
+        self._notify(CHANGE_AD, ad.id)
+        return True
     
     async def get_advertisement(self, ad_id: int) -> Optional[Advertisement]:
-        """Получает рекламное объявление по его ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute(
-                "SELECT * FROM advertisements WHERE id = ?", 
+        """Получает рекламное объявление по его ID (через кэш)"""
+        record = self.ad_cache.get(ad_id)
+        if record is MISSING:
+            rows = await self._fetchall_tuples(
+                f"SELECT {AD_COLUMNS} FROM advertisements WHERE id = ?", 
                 (ad_id,)
             )
-            row = await cursor.fetchone()
+            record = self._decode_advertisement(rows[0]) if rows else None
+            self.ad_cache.set(ad_id, record)
             
-            if not row:
-                return None
-                
-            button = None
-            if row['button_text'] and row['button_url']:
-                button = InlineButton(text=row['button_text'], url=row['button_url'])
+        return record.to_advertisement() if record else None
+    
+    async def get_advertisements_by_ids(self, ad_ids: Sequence[int]) -> Dict[int, AdvertisementRecord]:
+        """Получает неизменяемые объявления по списку ID (через кэш, недостающие одним запросом)"""
+        records = {}
+        missing = []
+        for ad_id in ad_ids:
+            record = self.ad_cache.get(ad_id)
+            if record is MISSING:
+                missing.append(ad_id)
+            elif record is not None:
+                records[ad_id] = record
                 
-            return Advertisement(
-                id=row['id'],
-                chat_id=row['chat_id'],
-                text=row['text'],
-                media_type=row['media_type'],
-                media_file_id=row['media_file_id'],
-                topic_id=row['topic_id'],
-                button=button,
-                interval_minutes=row['interval_minutes'],
-                duration_minutes=row['duration_minutes'],
-                is_active=bool(row['is_active']),
-                created_at=row['created_at'],
-                last_sent_at=row['last_sent_at']
+        if missing:
+            # Список ID передаётся одним JSON-параметром, без ограничения на число параметров
+            rows = await self._fetchall_tuples(
+                f"SELECT {AD_COLUMNS} FROM advertisements WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(missing),)
             )
+            for row in rows:
+                record = self._decode_advertisement(row)
+                self.ad_cache.set(record.id, record)
+                records[record.id] = record
+                
+        return records
     
     async def get_advertisements(self, chat_id: int, active_only: bool = False) -> List[Advertisement]:
         """Получает список рекламных объявлений для чата"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
-            query = "SELECT * FROM advertisements WHERE chat_id = ?"
-            params = [chat_id]
-            
-            if active_only:
-                query += " AND is_active = 1"
-                
-            cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
+        query = f"SELECT {AD_COLUMNS} FROM advertisements WHERE chat_id = ?"
+        params = [chat_id]
+        
+        if active_only:
+            query += " AND is_active = 1"
             
-            ads = []
-            for row in rows:
-                button = None
-                if row['button_text'] and row['button_url']:
-                    button = InlineButton(text=row['button_text'], url=row['button_url'])
-                    
-                ad = Advertisement(
-                    id=row['id'],
-                    chat_id=row['chat_id'],
-                    text=row['text'],
-                    media_type=row['media_type'],
-                    media_file_id=row['media_file_id'],
-                    topic_id=row['topic_id'],
-                    button=button,
-                    interval_minutes=row['interval_minutes'],
-                    duration_minutes=row['duration_minutes'],
-                    is_active=bool(row['is_active']),
-                    created_at=row['created_at'],
-                    last_sent_at=row['last_sent_at']
-                )
-                ads.append(ad)
-                
-            return ads
+        rows = await self._fetchall_tuples(query, params)
+        return [self._decode_advertisement(row).to_advertisement() for row in rows]
     
-    async def delete_advertisement(self, ad_id: int, chat_id: int) -> bool:
-        """Удаляет рекламное объявление из базы данных"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "DELETE FROM advertisements WHERE id = ? AND chat_id = ?",
-                (ad_id, chat_id)
+    async def count_advertisements(self, chat_id: int) -> int:
+        """Возвращает число рекламных объявлений чата"""
+        row = await self._fetchone(
+            "SELECT COUNT(*) AS total FROM advertisements WHERE chat_id = ?",
+            (chat_id,)
+        )
+        return row['total']
+    
+    async def get_advertisements_page(
+        self,
+        chat_id: int,
+        offset: int,
+        limit: int,
+        preview_length: int = 31
+    ) -> List[AdvertisementPreview]:
+        """Возвращает страницу объявлений чата (по возрастанию ID) с началом текста"""
+        # Смещение отсчитывается по индексу, строки таблицы читаются только для самой страницы
+        rows = await self._fetchall(
+            """
+            SELECT id, substr(text, 1, ?) AS text, is_active FROM advertisements
+            WHERE id IN (
+                SELECT id FROM advertisements WHERE chat_id = ?
+                ORDER BY id LIMIT ? OFFSET ?
             )
-            await db.commit()
-            return cursor.rowcount > 0
+            ORDER BY id
+            """,
+            (preview_length, chat_id, limit, offset)
+        )
+        return [
+            AdvertisementPreview(id=row['id'], text=row['text'], is_active=bool(row['is_active']))
+            for row in rows
+        ]
     
-    async def get_ads_for_sending(self) -> List[Advertisement]:
-        """Получает список объявлений, которые нужно отправить"""
-        current_time = int(time.time())
-        current_time_minutes = current_time // 60
+    def _search_conditions(self, chat_id: int, search: AdSearch) -> Tuple[str, List[Any]]:
+        """Строит условие WHERE и параметры для поиска объявлений чата"""
+        conditions = ["chat_id = ?"]
+        params: List[Any] = [chat_id]
+        
+        words = (search.text or "").split()
+        if words and self.fts_enabled:
+            # Каждое слово ищется как префикс, все слова должны встретиться в тексте
+            match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            conditions.append("id IN (SELECT rowid FROM ads_fts WHERE ads_fts MATCH ?)")
+            params.append(match)
+        else:
+            for word in words:
+                escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                conditions.append("text LIKE ? ESCAPE '\\'")
+                params.append(f"%{escaped}%")
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        if search.is_active is not None:
+            conditions.append("is_active = ?")
+            params.append(int(search.is_active))
             
-            cursor = await db.execute("""
-                SELECT a.* FROM advertisements a
-                JOIN chat_settings c ON a.chat_id = c.chat_id
-                WHERE a.is_active = 1 AND c.is_enabled = 1
-            """)
-            rows = await cursor.fetchall()
+        if search.media_type == "none":
+            conditions.append("media_type IS NULL")
+        elif search.media_type:
+            conditions.append("media_type = ?")
+            params.append(search.media_type)
             
-
-            ads_to_send = []
-            for row in rows:
-                if row['last_sent_at'] is None:
-                    ads_to_send.append(self._row_to_advertisement(row))
-                    continue
-                
-                last_sent_minutes = row['last_sent_at'] // 60
-                interval_minutes = row['interval_minutes']
-                
-                if (current_time_minutes - last_sent_minutes) >= interval_minutes:
-                    created_minutes = row['created_at'] // 60
-                    duration_minutes = row['duration_minutes']
-                    
-                    if (current_time_minutes - created_minutes) <= duration_minutes:
-                        ads_to_send.append(self._row_to_advertisement(row))
+        if search.topic_id is not None:
+            conditions.append("topic_id = ?")
+            params.append(search.topic_id)
             
-            return ads_to_send
+        return " AND ".join(conditions), params
+    
+    async def count_search_results(self, chat_id: int, search: AdSearch) -> int:
+        """Возвращает число объявлений чата, подходящих под условия поиска"""
+        where, params = self._search_conditions(chat_id, search)
+        row = await self._fetchone(
+            f"SELECT COUNT(*) AS total FROM advertisements WHERE {where}",
+            params
+        )
+        return row['total']
+    
+    async def search_advertisements(
+        self,
+        chat_id: int,
+        search: AdSearch,
+        offset: int,
+        limit: int,
+        preview_length: int = 31
+    ) -> List[AdvertisementPreview]:
+        """Возвращает страницу найденных объявлений чата (по возрастанию ID)"""
+        where, params = self._search_conditions(chat_id, search)
+        rows = await self._fetchall(
+            f"""
+            SELECT id, substr(text, 1, ?) AS text, is_active FROM advertisements
+            WHERE {where}
+            ORDER BY id LIMIT ? OFFSET ?
+            """,
+            [preview_length, *params, limit, offset]
+        )
+        return [
+            AdvertisementPreview(id=row['id'], text=row['text'], is_active=bool(row['is_active']))
+            for row in rows
+        ]
+    
+    async def delete_advertisement(self, ad_id: int, chat_id: int) -> bool:
+        """Удаляет рекламное объявление из базы данных"""
+        cursor = await self._execute(
+            "DELETE FROM advertisements WHERE id = ? AND chat_id = ?",
+            (ad_id, chat_id)
+        )
+        if cursor.rowcount > 0:
+            self.ad_cache.set(ad_id, None)
+            self._notify(CHANGE_AD, ad_id)
+            return True
+        return False
+    
+    async def get_ads_for_sending(self, current_time: Optional[int] = None) -> List[AdvertisementRecord]:
+        """Получает список объявлений, которые нужно отправить (поиск по индексу next_due_at)"""
+        if current_time is None:
+            current_time = int(time.time())
+        
+        # Индекс отдаёт только ID, сами объявления берутся из кэша
+        rows = await self._fetchall("""
+            SELECT a.id FROM advertisements a
+            JOIN chat_settings c ON a.chat_id = c.chat_id
+            WHERE a.is_active = 1 AND a.next_due_at <= ? AND a.expires_at >= ?
+                AND c.is_enabled = 1
+            ORDER BY a.next_due_at
+        """, (current_time, current_time))
+        
+        ad_ids = [row[0] for row in rows]
+        ads = await self.get_advertisements_by_ids(ad_ids)
+        return [ads[ad_id] for ad_id in ad_ids if ad_id in ads]
     
     async def get_active_advertisements(self, current_time: int) -> List[Advertisement]:
-        """Получает список активных рекламных объявлений для отправки на данный момент времени"""
-        current_time_minutes = current_time // 60
+        """Получает список активных рекламных объявлений, срок показа которых ещё не истёк"""
+        columns = ", ".join(f"a.{column}" for column in AD_COLUMNS.split(", "))
+        rows = await self._fetchall_tuples(f"""
+            SELECT {columns} FROM advertisements a
+            JOIN chat_settings c ON a.chat_id = c.chat_id
+            WHERE a.is_active = 1 AND a.expires_at >= ? AND c.is_enabled = 1
+        """, (current_time,))
         
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
-            cursor = await db.execute("""
-                SELECT a.* FROM advertisements a
-                JOIN chat_settings c ON a.chat_id = c.chat_id
-                WHERE a.is_active = 1 AND c.is_enabled = 1
-            """)
-            rows = await cursor.fetchall()
+        return [self._decode_advertisement(row).to_advertisement() for row in rows]
+    
+    async def get_schedule(
+        self,
+        current_time: int,
+        chat_id: Optional[int] = None,
+        ad_id: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Получает пары (ID, время следующей отправки) для объявлений, которые ещё будут показаны"""
+        query = """
+            SELECT a.id, a.next_due_at FROM advertisements a
+            JOIN chat_settings c ON a.chat_id = c.chat_id
+            WHERE a.is_active = 1 AND a.expires_at >= ? AND a.next_due_at <= a.expires_at
+                AND c.is_enabled = 1
+        """
+        params = [current_time]
+        
+        if chat_id is not None:
+            query += " AND a.chat_id = ?"
+            params.append(chat_id)
+        if ad_id is not None:
+            query += " AND a.id = ?"
+            params.append(ad_id)
             
-            active_ads = []
-            for row in rows:
-                created_at = row['created_at']
-                duration_minutes = row['duration_minutes']
-                ad_end_time = (created_at // 60) + duration_minutes
-                
-                if current_time_minutes > ad_end_time:
-                    continue
-                    
-                active_ads.append(self._row_to_advertisement(row))
-                
-            return active_ads
+        rows = await self._fetchall(query, params)
+        
+        return [(row[0], row[1]) for row in rows]
     
     async def get_last_sent_time(self, ad_id: int) -> Optional[int]:
         """Получает время последней отправки рекламы"""
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT last_sent_at FROM advertisements WHERE id = ?",
-                (ad_id,)
-            )
-            row = await cursor.fetchone()
-            return row[0] if row else None
+        row = await self._fetchone(
+            "SELECT last_sent_at FROM advertisements WHERE id = ?",
+            (ad_id,)
+        )
+        return row[0] if row else None
     
     async def update_last_sent_time(self, ad_id: int, timestamp: int) -> bool:
         """Обновляет время последней отправки рекламы"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "UPDATE advertisements SET last_sent_at = ? WHERE id = ?",
-                (timestamp, ad_id)
-            )
-            await db.commit()
-            return True
+        await self._execute(
+            """
+            UPDATE advertisements SET
+                last_sent_at = ?,
+                next_due_at = CASE WHEN ? + interval_minutes * 60 <= expires_at
+                    THEN ? + interval_minutes * 60 END
+            WHERE id = ?
+            """,
+            (timestamp, timestamp, timestamp, ad_id)
+        )
+        self._mark_sent_in_cache(ad_id, timestamp)
+        return True
+    
+    async def update_last_sent_times(self, sent: Sequence[Tuple[int, int]]):
+        """Обновляет время последней отправки для пар (ID, время) одной транзакцией"""
+        if not sent:
+            return
+            
+        await self._executemany(
+            """
+            UPDATE advertisements SET
+                last_sent_at = ?,
+                next_due_at = CASE WHEN ? + interval_minutes * 60 <= expires_at
+                    THEN ? + interval_minutes * 60 END
+            WHERE id = ?
+            """,
+            [(timestamp, timestamp, timestamp, ad_id) for ad_id, timestamp in sent]
+        )
+        for ad_id, timestamp in sent:
+            self._mark_sent_in_cache(ad_id, timestamp)
+    
+    def _mark_sent_in_cache(self, ad_id: int, timestamp: int):
+        """Повторяет в кэше изменения, которые update_last_sent_time вносит в базу"""
+        record = self.ad_cache.peek(ad_id)
+        if record is MISSING or record is None:
+            return
+        next_due_at = timestamp + record.interval_minutes * 60
+        if record.expires_at is not None and next_due_at > record.expires_at:
+            next_due_at = None
+        self.ad_cache.set(ad_id, record._replace(last_sent_at=timestamp, next_due_at=next_due_at))
             
     async def deactivate_chat_settings(self, chat_id: int) -> bool:
         """Деактивирует настройки чата"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "UPDATE chat_settings SET is_enabled = 0 WHERE chat_id = ?",
-                (chat_id,)
-            )
-            await db.commit()
-            return True
+        await self._execute(
+            "UPDATE chat_settings SET is_enabled = 0 WHERE chat_id = ?",
+            (chat_id,)
+        )
+        self.chat_settings_cache.invalidate(chat_id)
+        self._notify(CHANGE_CHAT, chat_id)
+        return True
     
-    def _row_to_advertisement(self, row) -> Advertisement:
-        """Преобразует строку из БД в объект Advertisement"""
-        button = None
-        if row['button_text'] and row['button_url']:
-            button = InlineButton(text=row['button_text'], url=row['button_url'])
-            
-        return Advertisement(
-            id=row['id'],
+    async def get_fsm_record(self, key: str) -> Optional[Tuple[Optional[str], str, int]]:
+        """Возвращает (состояние, данные в JSON, время изменения) записи FSM"""
+        row = await self._fetchone(
+            "SELECT state, data, updated_at FROM fsm_states WHERE key = ?",
+            (key,)
+        )
+        if not row:
+            return None
+        return row['state'], row['data'], row['updated_at']
+    
+    async def save_fsm_record(self, key: str, state: Optional[str], data: str, updated_at: int):
+        """Сохраняет состояние и данные FSM"""
+        await self._execute(
+            """
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (key, state, data, updated_at)
+        )
+    
+    async def delete_fsm_record(self, key: str):
+        """Удаляет запись FSM"""
+        await self._execute("DELETE FROM fsm_states WHERE key = ?", (key,))
+    
+    async def get_fsm_keys(self, updated_after: int) -> List[Tuple[str, bool, int]]:
+        """Возвращает (ключ, есть ли состояние, время изменения) записей FSM, изменённых после указанного времени"""
+        rows = await self._fetchall(
+            "SELECT key, state IS NOT NULL AS has_state, updated_at FROM fsm_states WHERE updated_at >= ?",
+            (updated_after,)
+        )
+        return [(row['key'], bool(row['has_state']), row['updated_at']) for row in rows]
+    
+    async def delete_expired_fsm_records(self, updated_before: int) -> int:
+        """Удаляет записи FSM, не изменявшиеся с указанного времени, и возвращает их число"""
+        cursor = await self._execute(
+            "DELETE FROM fsm_states WHERE updated_at < ?",
+            (updated_before,)
+        )
+        return cursor.rowcount
+    
+    @staticmethod
+    def _row_to_chat_settings(row, admin_ids: Set[int]) -> ChatSettings:
+        """Преобразует строку из БД и список администраторов в объект ChatSettings"""
+        return ChatSettings(
             chat_id=row['chat_id'],
-            text=row['text'],
-            media_type=row['media_type'],
-            media_file_id=row['media_file_id'],
-            topic_id=row['topic_id'],
-            button=button,
-            interval_minutes=row['interval_minutes'],
-            duration_minutes=row['duration_minutes'],
-            is_active=bool(row['is_active']),
-            created_at=row['created_at'],
-            last_sent_at=row['last_sent_at']
-        ) 
\ No newline at end of file
+            is_enabled=bool(row['is_enabled']),
+            admin_ids=admin_ids
+        )
+    
+    @staticmethod
+    def _copy_chat_settings(settings: Optional[ChatSettings]) -> Optional[ChatSettings]:
+        """Возвращает копию настроек, чтобы изменения в обработчиках не портили кэш"""
+        if settings is None:
+            return None
+        admin_ids = set(settings.admin_ids) if settings.admin_ids is not None else None
+        return dataclasses.replace(settings, admin_ids=admin_ids)
+    
+    @staticmethod
+    def _schedule_times(ad: Advertisement) -> Tuple[Optional[int], int]:
+        """Вычисляет время следующей отправки и время окончания показа объявления.
+        
+        Если следующая отправка выпадает на время после окончания показа, next_due_at
+        равен None: такие объявления не попадают в индекс idx_advertisements_due.
+        """
+        if ad.last_sent_at is None:
+            next_due_at = ad.created_at
+        else:
+            next_due_at = ad.last_sent_at + ad.interval_minutes * 60
+            
+        expires_at = ad.created_at + ad.duration_minutes * 60
+        if next_due_at > expires_at:
+            next_due_at = None
+        return next_due_at, expires_at
+    
+    @staticmethod
+    def _decode_advertisement(row: Sequence) -> AdvertisementRecord:
+        """Преобразует строку из БД со столбцами AD_COLUMNS в AdvertisementRecord"""
+        (
+            ad_id, chat_id, text, media_type, media_file_id, topic_id, button_text, button_url,
+            interval_minutes, duration_minutes, is_active, created_at, last_sent_at, next_due_at, expires_at
+        ) = row
+        button = InlineButton(button_text, button_url) if button_text and button_url else None
+        return AdvertisementRecord(
+            ad_id, chat_id, text, media_type, media_file_id, topic_id, button,
+            interval_minutes, duration_minutes, bool(is_active), created_at, last_sent_at,
+            next_due_at, expires_at
+        )
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+import copy
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import config
+from database.cache import LRUCache, MISSING
+from database.database import Database
+
+
+logger = logging.getLogger(__name__)
+
+# (состояние, данные, время последнего изменения)
+FSMRecord = Tuple[Optional[str], Dict[str, Any], int]
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM в SQLite с кэшем в памяти и удалением сценариев, брошенных дольше ttl секунд"""
+
+    def __init__(
+        self,
+        db: Database,
+        ttl: int = config.FSM_TTL,
+        cache_size: int = config.FSM_CACHE_SIZE,
+        sweep_interval: float = config.FSM_SWEEP_INTERVAL
+    ):
+        self.db = db
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.cache = LRUCache(cache_size, ttl)
+        # Все ключи, записанные в fsm_states, и время их изменения: для остальных ключей
+        # (обычная переписка в группах) get_state/get_data не обращаются ни к базе, ни к кэшу
+        self._stored: Dict[str, int] = {}
+        # Ключи с незавершённым сценарием и время их изменения (для UpdatePrefilter)
+        self._active: Dict[str, int] = {}
+        self._sweeper_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> int:
+        """Загружает ключи активных сценариев, запускает очистку и возвращает число сценариев"""
+        cutoff = int(time.time()) - self.ttl
+        keys = await self.db.get_fsm_keys(cutoff)
+        self._stored = {key: updated_at for key, _, updated_at in keys}
+        self._active = {key: updated_at for key, has_state, updated_at in keys if has_state}
+        if self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._sweep_loop())
+        return len(self._active)
+
+    async def close(self):
+        if self._sweeper_task is None:
+            return
+
+        task, self._sweeper_task = self._sweeper_task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def has_state(self, bot_id: int, chat_id: int, user_id: int) -> bool:
+        """Проверяет без запросов к базе, есть ли у пользователя незавершённый сценарий"""
+        key = self.key_builder.build(StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=user_id))
+        updated_at = self._active.get(key)
+        return updated_at is not None and updated_at >= time.time() - self.ttl
+
+    async def _load(self, key: str) -> Optional[FSMRecord]:
+        if key not in self._stored:
+            return None
+
+        record = self.cache.get(key)
+        if record is MISSING:
+            row = await self.db.get_fsm_record(key)
+            record = None
+            if row is not None:
+                state, data, updated_at = row
+                record = (state, json.loads(data), updated_at)
+            self.cache.set(key, record)
+
+        if record is not None and record[2] < time.time() - self.ttl:
+            return None
+        return record
+
+    async def _save(
+        self,
+        key: str,
+        previous: Optional[FSMRecord],
+        state: Optional[str],
+        data: Dict[str, Any]
+    ):
+        if state is None and not data:
+            # Пустая запись не хранится (так завершается state.clear())
+            self.cache.invalidate(key)
+            self._stored.pop(key, None)
+            self._active.pop(key, None)
+            if previous is not None:
+                await self.db.delete_fsm_record(key)
+            return
+
+        now = int(time.time())
+        self.cache.set(key, (state, data, now))
+        self._stored[key] = now
+        if state is None:
+            self._active.pop(key, None)
+        else:
+            self._active[key] = now
+        await self.db.save_fsm_record(key, state, json.dumps(data, ensure_ascii=False), now)
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        storage_key = self.key_builder.build(key)
+        record = await self._load(storage_key)
+        data = record[1] if record else {}
+        state = state.state if isinstance(state, State) else state
+        await self._save(storage_key, record, state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._load(self.key_builder.build(key))
+        return record[0] if record else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]):
+        storage_key = self.key_builder.build(key)
+        record = await self._load(storage_key)
+        state = record[0] if record else None
+        await self._save(storage_key, record, state, copy.deepcopy(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._load(self.key_builder.build(key))
+        return copy.deepcopy(record[1]) if record else {}
+
+    async def sweep(self) -> int:
+        """Удаляет сценарии, которые не менялись дольше ttl, и возвращает число удалённых записей"""
+        cutoff = int(time.time()) - self.ttl
+        expired = [key for key, updated_at in self._stored.items() if updated_at < cutoff]
+        for key in expired:
+            del self._stored[key]
+            self._active.pop(key, None)
+            self.cache.invalidate(key)
+
+        return await self.db.delete_expired_fsm_records(cutoff)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Удалено брошенных сценариев FSM: {removed}")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке хранилища FSM: {e}", exc_info=True)
@@ -0,0 +1,225 @@
+import logging
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+async def _get_columns(db: aiosqlite.Connection, table: str) -> set:
+    """Возвращает множество имён столбцов таблицы"""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        return {row[1] for row in await cursor.fetchall()}
+
+
+async def _create_base_tables(db: aiosqlite.Connection):
+    """Создаёт исходные таблицы настроек чатов и объявлений"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_settings (
+            chat_id INTEGER PRIMARY KEY,
+            is_enabled INTEGER DEFAULT 1,
+            admin_ids TEXT DEFAULT '[]'
+        )
+    """)
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS advertisements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            media_type TEXT,
+            media_file_id TEXT,
+            topic_id INTEGER,
+            button_text TEXT,
+            button_url TEXT,
+            interval_minutes INTEGER DEFAULT 60,
+            duration_minutes INTEGER DEFAULT 1440,
+            is_active INTEGER DEFAULT 1,
+            created_at INTEGER,
+            last_sent_at INTEGER,
+            FOREIGN KEY (chat_id) REFERENCES chat_settings (chat_id) ON DELETE CASCADE
+        )
+    """)
+
+
+async def _add_schedule_columns(db: aiosqlite.Connection):
+    """Добавляет столбцы next_due_at/expires_at и индекс для выборки объявлений к отправке"""
+    columns = await _get_columns(db, "advertisements")
+
+    for column in ("next_due_at", "expires_at"):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE advertisements ADD COLUMN {column} INTEGER")
+
+    await db.execute("""
+        UPDATE advertisements SET
+            next_due_at = COALESCE(last_sent_at + interval_minutes * 60, created_at),
+            expires_at = created_at + duration_minutes * 60
+        WHERE next_due_at IS NULL OR expires_at IS NULL
+    """)
+
+    # Показ которых закончился (или закончится до следующей отправки), в индекс не попадают
+    await db.execute("""
+        UPDATE advertisements SET next_due_at = NULL
+        WHERE next_due_at > expires_at OR expires_at < CAST(strftime('%s', 'now') AS INTEGER)
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_advertisements_due
+        ON advertisements (next_due_at, expires_at)
+        WHERE is_active = 1 AND next_due_at IS NOT NULL
+    """)
+
+
+async def _add_chat_indexes(db: aiosqlite.Connection):
+    """Добавляет индекс объявлений по чату (выборка по чату, JOIN планировщика, каскадное удаление)"""
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_advertisements_chat_active
+        ON advertisements (chat_id, is_active)
+    """)
+
+
+async def _create_fsm_states(db: aiosqlite.Connection):
+    """Создаёт таблицу состояний и данных FSM (сценарии создания и редактирования объявлений)"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at INTEGER NOT NULL
+        )
+    """)
+
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_updated
+        ON fsm_states (updated_at)
+    """)
+
+
+async def _reindex_ads_by_chat(db: aiosqlite.Connection):
+    """Заменяет индекс (chat_id, is_active) на (chat_id) для постраничного списка объявлений"""
+    # Записи индекса (chat_id) упорядочены по id, поэтому страница читается без сортировки
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_advertisements_chat
+        ON advertisements (chat_id)
+    """)
+    await db.execute("DROP INDEX IF EXISTS idx_advertisements_chat_active")
+
+
+async def _create_ads_fts(db: aiosqlite.Connection):
+    """Создаёт полнотекстовый индекс FTS5 по тексту объявлений и триггеры его обновления"""
+    try:
+        await db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+                text,
+                content = 'advertisements',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+    except aiosqlite.OperationalError as e:
+        # SQLite без FTS5: поиск объявлений будет работать через LIKE
+        logger.warning(f"Полнотекстовый поиск недоступен: {e}")
+        return
+
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS advertisements_fts_insert
+        AFTER INSERT ON advertisements BEGIN
+            INSERT INTO ads_fts (rowid, text) VALUES (new.id, new.text);
+        END
+    """)
+
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS advertisements_fts_delete
+        AFTER DELETE ON advertisements BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+    """)
+
+    await db.execute("""
+        CREATE TRIGGER IF NOT EXISTS advertisements_fts_update
+        AFTER UPDATE OF text ON advertisements
+        WHEN old.text IS NOT new.text BEGIN
+            INSERT INTO ads_fts (ads_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO ads_fts (rowid, text) VALUES (new.id, new.text);
+        END
+    """)
+
+    await db.execute("INSERT INTO ads_fts (ads_fts) VALUES ('rebuild')")
+
+
+async def _create_chat_admins(db: aiosqlite.Connection):
+    """Переносит администраторов из JSON-столбца chat_settings.admin_ids в таблицу chat_admins"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS chat_admins (
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, user_id),
+            FOREIGN KEY (chat_id) REFERENCES chat_settings (chat_id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+    # Столбец admin_ids остаётся в таблице для совместимости, но больше не используется
+    await db.execute("""
+        INSERT OR IGNORE INTO chat_admins (chat_id, user_id)
+        SELECT c.chat_id, j.value
+        FROM chat_settings c, json_each(c.admin_ids) j
+        WHERE json_valid(c.admin_ids) AND j.type = 'integer'
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    (1, "базовые таблицы", _create_base_tables),
+    (2, "время следующей отправки и окончания показа", _add_schedule_columns),
+    (3, "индекс объявлений по чату", _add_chat_indexes),
+    (4, "хранилище состояний FSM", _create_fsm_states),
+    (5, "индекс объявлений по чату в порядке id", _reindex_ads_by_chat),
+    (6, "полнотекстовый поиск объявлений", _create_ads_fts),
+    (7, "таблица администраторов чатов", _create_chat_admins),
+]
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Возвращает текущую версию схемы базы данных"""
+    async with db.execute("SELECT MAX(version) FROM schema_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def apply_migrations(db: aiosqlite.Connection) -> int:
+    """Применяет к базе данных все ещё не применённые миграции и возвращает версию схемы"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at INTEGER
+        )
+    """)
+    await db.commit()
+
+    current_version = await get_schema_version(db)
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        await db.execute("BEGIN")
+        try:
+            await migrate(db)
+            await db.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, int(time.time()))
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.error(f"Не удалось применить миграцию {version}: {description}")
+            raise
+
+        current_version = version
+        logger.info(f"Применена миграция схемы {version}: {description}")
+
+    return current_version
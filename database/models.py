@@ -1,15 +1,15 @@
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, Dict, Any, NamedTuple, Set, Union
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class InlineButton:
     """Модель для инлайн-кнопки в рекламном сообщении"""
     text: str
     url: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Advertisement:
     """Модель для рекламного сообщения"""
     id: int = None  
@@ -24,11 +24,52 @@ class Advertisement:
     is_active: bool = True 
     created_at: int = None  
     last_sent_at: Optional[int] = None 
+    next_due_at: Optional[int] = None 
+    expires_at: Optional[int] = None 
 
 
-@dataclass
+class AdvertisementRecord(NamedTuple):
+    """Неизменяемое объявление для кэша и планировщика (поля в том же порядке, что у Advertisement)"""
+    id: int
+    chat_id: int
+    text: str
+    media_type: Optional[str]
+    media_file_id: Optional[str]
+    topic_id: Optional[int]
+    button: Optional[InlineButton]
+    interval_minutes: int
+    duration_minutes: int
+    is_active: bool
+    created_at: int
+    last_sent_at: Optional[int]
+    next_due_at: Optional[int]
+    expires_at: Optional[int]
+
+    def to_advertisement(self) -> Advertisement:
+        """Возвращает изменяемую копию для обработчиков"""
+        return Advertisement(*self)
+
+
+@dataclass(slots=True)
+class AdvertisementPreview:
+    """Краткие данные объявления для строки списка"""
+    id: int
+    text: str
+    is_active: bool
+
+
+@dataclass(slots=True)
+class AdSearch:
+    """Условия поиска объявлений"""
+    text: Optional[str] = None
+    is_active: Optional[bool] = None
+    media_type: Optional[str] = None  # "photo", "video" или "none" (без медиа)
+    topic_id: Optional[int] = None
+
+
+@dataclass(slots=True)
 class ChatSettings:
     """Модель для настроек чата"""
     chat_id: int   
     is_enabled: bool = True 
-    admin_ids: List[int] = None  
\ No newline at end of file
+    admin_ids: Set[int] = None  
\ No newline at end of file
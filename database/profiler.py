@@ -0,0 +1,217 @@
+import functools
+import inspect
+import logging
+import math
+import sys
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Sequence
+
+from config import config
+
+
+# Отдельный логгер, чтобы журнал медленных запросов можно было вести в своём файле
+slow_query_logger = logging.getLogger("database.slow_queries")
+
+# Публичный метод Database, внутри которого сейчас выполняется запрос
+current_method: ContextVar[str] = ContextVar("db_method", default="")
+
+PARAMS_REPR_LIMIT = 300
+
+SORT_KEYS = ("total", "calls", "avg", "max", "rows")
+
+
+def normalize_sql(sql: str) -> str:
+    """Сворачивает переносы и отступы запроса в одну строку"""
+    return " ".join(sql.split())
+
+
+def format_params(params: Any) -> str:
+    """Параметры запроса для журнала, обрезанные до PARAMS_REPR_LIMIT символов"""
+    text = repr(tuple(params)) if isinstance(params, (list, tuple)) else repr(params)
+    if len(text) > PARAMS_REPR_LIMIT:
+        text = text[:PARAMS_REPR_LIMIT] + "…"
+    return text
+
+
+class QueryStats:
+    """Накопленная статистика одного текста запроса"""
+
+    __slots__ = ("sql", "method", "calls", "total", "max", "rows", "acquire", "last_params")
+
+    def __init__(self, sql: str, method: str):
+        self.sql = sql
+        self.method = method
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.acquire = 0.0
+        self.last_params: Any = ()
+
+    def add(self, elapsed: float, rows: int, acquire: float, params: Any):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.rows += rows
+        self.acquire += acquire
+        self.last_params = params
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class MethodStats:
+    """Накопленная статистика публичного метода Database (включая ответы из кэша)"""
+
+    __slots__ = ("name", "calls", "total", "max", "queries", "rows", "acquire")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.acquire = 0.0
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class SlowQuery:
+    """Запись журнала медленных запросов"""
+
+    __slots__ = ("sql", "params", "method", "elapsed", "rows", "plan", "at")
+
+    def __init__(self, sql: str, params: Any, method: str, elapsed: float, rows: int, plan: List[str]):
+        self.sql = sql
+        self.params = params
+        self.method = method
+        self.elapsed = elapsed
+        self.rows = rows
+        self.plan = plan
+        self.at = time.time()
+
+
+class QueryProfiler:
+    """Время, строки и ожидание соединения по запросам и методам Database, журнал медленных запросов"""
+
+    def __init__(
+        self,
+        enabled: bool = config.DB_PROFILE,
+        slow_query_ms: float = config.DB_SLOW_QUERY_MS,
+        history: int = config.DB_SLOW_QUERY_HISTORY
+    ):
+        self.enabled = enabled
+        self.slow_threshold = slow_query_ms / 1000 if slow_query_ms > 0 else math.inf
+        self.started_at = time.time()
+        self.queries: Dict[str, QueryStats] = {}
+        self.methods: Dict[str, MethodStats] = {}
+        # План запроса снимается один раз на текст запроса
+        self.plans: Dict[str, List[str]] = {}
+        self.slow: Deque[SlowQuery] = deque(maxlen=history)
+        self.slow_count = 0
+
+    def record(self, sql: str, params: Any, elapsed: float, rows: int, acquire: float) -> bool:
+        """Учитывает выполненный запрос; возвращает True, если он медленнее порога"""
+        if self.enabled:
+            method = current_method.get()
+            stats = self.queries.get(sql)
+            if stats is None:
+                stats = self.queries[sql] = QueryStats(sql, method)
+            stats.add(elapsed, rows, acquire, params)
+
+            method_stats = self._method(method)
+            method_stats.queries += 1
+            method_stats.rows += rows
+            method_stats.acquire += acquire
+        return elapsed >= self.slow_threshold
+
+    def record_method(self, name: str, elapsed: float):
+        stats = self._method(name)
+        stats.calls += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+
+    def _method(self, name: str) -> MethodStats:
+        stats = self.methods.get(name)
+        if stats is None:
+            stats = self.methods[name] = MethodStats(name)
+        return stats
+
+    def log_slow(self, sql: str, params: Any, elapsed: float, rows: int, plan: List[str], method: str):
+        """Пишет медленный запрос в журнал вместе с параметрами и планом выполнения"""
+        self.slow_count += 1
+        self.slow.append(SlowQuery(sql, params, method, elapsed, rows, plan))
+        slow_query_logger.warning(
+            f"Медленный запрос {elapsed * 1000:.1f} мс ({method}, строк: {rows}): {normalize_sql(sql)}"
+            f" | параметры: {format_params(params)}"
+            f" | план: {'; '.join(plan) or '-'}"
+        )
+
+    def top(self, limit: int = 10, sort: str = "total") -> List[QueryStats]:
+        """Самые затратные запросы по одному из SORT_KEYS"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {sort}")
+        return sorted(self.queries.values(), key=lambda stats: getattr(stats, sort), reverse=True)[:limit]
+
+    def reset(self):
+        """Обнуляет накопленную статистику (планы и журнал медленных запросов сохраняются)"""
+        self.queries.clear()
+        self.methods.clear()
+        self.started_at = time.time()
+
+
+def caller_method(owner: Any) -> str:
+    """Имя ближайшего публичного метода owner в стеке вызовов (когда профилирование методов выключено)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        name = frame.f_code.co_name
+        if not name.startswith("_") and frame.f_locals.get("self") is owner:
+            return name
+        frame = frame.f_back
+    return "-"
+
+
+def profile_methods(exclude: Sequence[str] = ("connect", "close")) -> Callable[[type], type]:
+    """Декоратор класса Database: учитывает вызовы публичных async-методов в self.profiler.
+
+    Метод запоминается в current_method, чтобы запросы внутри него попали в его статистику.
+    При выключенном DB_PROFILE класс не меняется.
+    """
+    def decorate(cls: type) -> type:
+        if not config.DB_PROFILE:
+            return cls
+
+        for name, func in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not inspect.iscoroutinefunction(func):
+                continue
+            setattr(cls, name, _profiled(func, name))
+        return cls
+    return decorate
+
+
+def _profiled(func: Callable, name: str) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        token = current_method.set(name)
+        started = time.perf_counter()
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            current_method.reset(token)
+            self.profiler.record_method(name, time.perf_counter() - started)
+    return wrapper
+
+
+def setup_slow_query_log(path: str):
+    """Направляет журнал медленных запросов в отдельный файл"""
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+    slow_query_logger.addHandler(handler)
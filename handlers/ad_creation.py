@@ -27,14 +27,6 @@ class AdCreationStates(StatesGroup):
     waiting_for_custom_duration = State()
 
 
-ad_creation_data = {}
-
-
-def get_user_chat_key(user_id: int, chat_id: int) -> str:
-    """Генерирует ключ для хранения временных данных"""
-    return f"{user_id}_{chat_id}"
-
-
 @router.callback_query(F.data == "add_ad")
 async def add_advertisement(callback: CallbackQuery, state: FSMContext, is_admin: bool):
     """Обработчик начала создания нового рекламного объявления"""
@@ -42,13 +34,10 @@ async def add_advertisement(callback: CallbackQuery, state: FSMContext, is_admin
         await callback.answer("⛔ У вас нет прав на создание объявлений.", show_alert=True)
         return
     
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
-    
-    ad_creation_data[user_chat_key] = {
+    await state.set_data({
         "chat_id": callback.message.chat.id,
         "created_at": int(time.time())
-    }
-    
+    })
     await state.set_state(AdCreationStates.waiting_for_text)
     
     await callback.message.edit_text(
@@ -69,8 +58,7 @@ async def process_ad_text(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    ad_creation_data[user_chat_key]["text"] = message.text
+    await state.update_data(text=message.text)
     
     await message.answer(
         "📊 Выберите тип медиа для объявления:",
@@ -84,11 +72,9 @@ async def process_ad_text(message: Message, state: FSMContext):
 async def process_media_type(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора типа медиа"""
     media_type = callback.data.split(":")[1]
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
     
     if media_type == "none":
-        ad_creation_data[user_chat_key]["media_type"] = None
-        ad_creation_data[user_chat_key]["media_file_id"] = None
+        await state.update_data(media_type=None, media_file_id=None)
         
         await callback.message.edit_text(
             "🔘 Нужна ли инлайн-кнопка для этого объявления?",
@@ -98,7 +84,7 @@ async def process_media_type(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    ad_creation_data[user_chat_key]["media_type"] = media_type
+    await state.update_data(media_type=media_type)
     
     await callback.message.edit_text(
         f"📤 Отправьте {'фото' if media_type == 'photo' else 'видео'} для объявления.\n\n"
@@ -111,8 +97,8 @@ async def process_media_type(callback: CallbackQuery, state: FSMContext):
 @router.message(StateFilter(AdCreationStates.waiting_for_media))
 async def process_media_file(message: Message, state: FSMContext):
     """Обработчик получения медиа-файла"""
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    media_type = ad_creation_data[user_chat_key].get("media_type")
+    ad_data = await state.get_data()
+    media_type = ad_data.get("media_type")
     
     if message.text == "/cancel":
         await state.clear()
@@ -134,7 +120,7 @@ async def process_media_file(message: Message, state: FSMContext):
         )
         return
     
-    ad_creation_data[user_chat_key]["media_file_id"] = file_id
+    await state.update_data(media_file_id=file_id)
     
     await message.answer(
         "🔘 Нужна ли инлайн-кнопка для этого объявления?",
@@ -147,10 +133,9 @@ async def process_media_file(message: Message, state: FSMContext):
 async def process_need_button(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора необходимости кнопки"""
     need_button = callback.data.split(":")[1] == "yes"
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
     
     if not need_button:
-        ad_creation_data[user_chat_key]["button"] = None
+        await state.update_data(button=None)
         
         await callback.message.edit_text(
             "📚 Нужно ли отправлять объявление в конкретной теме? (для чатов с темами)",
@@ -178,12 +163,7 @@ async def process_button_text(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    
-    if "button" not in ad_creation_data[user_chat_key]:
-        ad_creation_data[user_chat_key]["button"] = {}
-    
-    ad_creation_data[user_chat_key]["button"]["text"] = message.text
+    await state.update_data(button={"text": message.text})
     
     await message.answer(
         "🔗 Введите URL для кнопки (должен начинаться с http:// или https://).\n\n"
@@ -203,8 +183,6 @@ async def process_button_url(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    
     url = message.text.strip()
     if not (url.startswith("http://") or url.startswith("https://")):
         await message.answer(
@@ -214,7 +192,8 @@ async def process_button_url(message: Message, state: FSMContext):
         )
         return
     
-    ad_creation_data[user_chat_key]["button"]["url"] = url
+    ad_data = await state.get_data()
+    await state.update_data(button={**(ad_data.get("button") or {}), "url": url})
     
     await message.answer(
         "📚 Нужно ли отправлять объявление в конкретной теме? (для чатов с темами)",
@@ -227,10 +206,9 @@ async def process_button_url(message: Message, state: FSMContext):
 async def process_need_topic(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора необходимости темы"""
     need_topic = callback.data.split(":")[1] == "yes"
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
     
     if not need_topic:
-        ad_creation_data[user_chat_key]["topic_id"] = None
+        await state.update_data(topic_id=None)
         
         await callback.message.edit_text(
             "⏱️ Выберите интервал между отправками объявления:",
@@ -259,8 +237,6 @@ async def process_topic_id(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    
     try:
         topic_id = int(message.text.strip())
         if topic_id <= 0:
@@ -273,7 +249,7 @@ async def process_topic_id(message: Message, state: FSMContext):
         )
         return
     
-    ad_creation_data[user_chat_key]["topic_id"] = topic_id
+    await state.update_data(topic_id=topic_id)
     
     await message.answer(
         "⏱️ Выберите интервал между отправками объявления:",
@@ -286,7 +262,6 @@ async def process_topic_id(message: Message, state: FSMContext):
 async def process_interval(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора интервала отправки"""
     interval_value = callback.data.split(":")[1]
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
     
     if interval_value == "custom":
         await callback.message.edit_text(
@@ -297,7 +272,7 @@ async def process_interval(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    ad_creation_data[user_chat_key]["interval_minutes"] = int(interval_value)
+    await state.update_data(interval_minutes=int(interval_value))
     
     await callback.message.edit_text(
         "📆 Выберите длительность показа объявления:",
@@ -319,8 +294,6 @@ async def process_custom_interval(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    
     try:
         interval = int(message.text.strip())
         if interval < config.MIN_INTERVAL or interval > config.MAX_INTERVAL:
@@ -333,7 +306,7 @@ async def process_custom_interval(message: Message, state: FSMContext):
         )
         return
     
-    ad_creation_data[user_chat_key]["interval_minutes"] = interval
+    await state.update_data(interval_minutes=interval)
     
     await message.answer(
         "📆 Выберите длительность показа объявления:",
@@ -346,7 +319,6 @@ async def process_custom_interval(message: Message, state: FSMContext):
 async def process_duration(callback: CallbackQuery, state: FSMContext):
     """Обработчик выбора длительности показа"""
     duration_value = callback.data.split(":")[1]
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
     
     if duration_value == "custom":
         await callback.message.edit_text(
@@ -357,9 +329,9 @@ async def process_duration(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    ad_creation_data[user_chat_key]["duration_minutes"] = int(duration_value)
+    await state.update_data(duration_minutes=int(duration_value))
     
-    await show_ad_summary(callback, user_chat_key)
+    await show_ad_summary(callback, await state.get_data())
 
 
 @router.message(StateFilter(AdCreationStates.waiting_for_custom_duration))
@@ -375,8 +347,6 @@ async def process_custom_duration(message: Message, state: FSMContext):
         )
         return
     
-    user_chat_key = get_user_chat_key(message.from_user.id, message.chat.id)
-    
     try:
         duration = int(message.text.strip())
         if duration < config.MIN_DURATION or duration > config.MAX_DURATION:
@@ -389,16 +359,14 @@ async def process_custom_duration(message: Message, state: FSMContext):
         )
         return
     
-    ad_creation_data[user_chat_key]["duration_minutes"] = duration
+    await state.update_data(duration_minutes=duration)
     
-    await show_ad_summary(message, user_chat_key)
+    await show_ad_summary(message, await state.get_data())
     await state.set_state(None)  
 
 
-async def show_ad_summary(message_or_callback, user_chat_key: str):
+async def show_ad_summary(message_or_callback, ad_data: dict):
     """Показывает сводку о создаваемом объявлении и запрашивает подтверждение"""
-    ad_data = ad_creation_data[user_chat_key]
-    
     text = "📋 Сводка о создаваемом объявлении:\n\n"
     
     ad_text = ad_data.get("text", "Не указан")
@@ -460,14 +428,11 @@ async def show_ad_summary(message_or_callback, user_chat_key: str):
 @router.callback_query(F.data == "confirm_ad:yes")
 async def confirm_ad_creation(callback: CallbackQuery, db: Database, state: FSMContext):
     """Обработчик подтверждения создания объявления"""
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
-    
-    if user_chat_key not in ad_creation_data:
+    ad_data = await state.get_data()
+    if "chat_id" not in ad_data:
         await callback.answer("❌ Ошибка: данные объявления не найдены", show_alert=True)
         return
     
-    ad_data = ad_creation_data[user_chat_key]
-    
     button = None
     if ad_data.get("button"):
         from database.models import InlineButton
@@ -491,7 +456,6 @@ async def confirm_ad_creation(callback: CallbackQuery, db: Database, state: FSMC
     
     ad_id = await db.add_advertisement(advertisement)
     
-    del ad_creation_data[user_chat_key]
     await state.clear()
     
     await callback.message.edit_text(
@@ -505,11 +469,6 @@ async def confirm_ad_creation(callback: CallbackQuery, db: Database, state: FSMC
 @router.callback_query(F.data == "cancel_ad_creation")
 async def cancel_ad_creation(callback: CallbackQuery, state: FSMContext):
     """Обработчик отмены создания объявления"""
-    user_chat_key = get_user_chat_key(callback.from_user.id, callback.message.chat.id)
-    
-    if user_chat_key in ad_creation_data:
-        del ad_creation_data[user_chat_key]
-    
     await state.clear()
     
     await callback.message.edit_text(
@@ -2,11 +2,14 @@ from aiogram import Router, F, Bot
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
+from aiogram.fsm.state import State, StatesGroup
+import dataclasses
 import time
 
 from database.database import Database
-from database.models import Advertisement, InlineButton
+from database.models import AdSearch, Advertisement, InlineButton
 from keyboards.inline import (
+    ADS_PER_PAGE,
     get_ads_list_keyboard,
     get_ad_control_keyboard,
     get_delete_confirmation_keyboard,
@@ -16,20 +19,32 @@ from keyboards.inline import (
 router = Router()
 
 
+class AdSearchStates(StatesGroup):
+    waiting_for_query = State()
+
 
 current_page_cache = {}
 
+SEARCH_HELP = (
+    "🔍 Введите слова для поиска по тексту объявлений.\n\n"
+    "Можно добавить фильтры:\n"
+    "статус:вкл или статус:выкл\n"
+    "медиа:фото, медиа:видео или медиа:нет\n"
+    "тема:ID\n\n"
+    "Например: скидка статус:вкл медиа:фото\n\n"
+    "Для отмены, введите /cancel."
+)
 
-@router.callback_query(F.data == "list_ads")
-async def list_advertisements(callback: CallbackQuery, db: Database, is_admin: bool):
-    """Обработчик просмотра списка рекламных объявлений"""
-    if not is_admin:
-        await callback.answer("⛔ У вас нет прав на просмотр объявлений.", show_alert=True)
-        return
-    
-    ads = await db.get_advertisements(callback.message.chat.id)
+SEARCH_STATUSES = {"вкл": True, "выкл": False}
+SEARCH_MEDIA_TYPES = {"фото": "photo", "видео": "video", "нет": "none"}
+
+
+async def show_ads_page(callback: CallbackQuery, db: Database, page: int):
+    """Показывает страницу списка объявлений чата"""
+    chat_id = callback.message.chat.id
+    total = await db.count_advertisements(chat_id)
     
-    if not ads:
+    if not total:
         await callback.message.edit_text(
             "📝 В этом чате пока нет рекламных объявлений.\n\n"
             "Нажмите кнопку 'Добавить объявление', чтобы создать новое.",
@@ -38,40 +53,36 @@ async def list_advertisements(callback: CallbackQuery, db: Database, is_admin: b
         await callback.answer()
         return
     
-    current_page_cache[callback.from_user.id] = 0
+    # После удаления объявлений запомненная страница может оказаться за концом списка
+    page = min(page, (total - 1) // ADS_PER_PAGE)
+    current_page_cache[callback.from_user.id] = page
+    
+    ads = await db.get_advertisements_page(chat_id, page * ADS_PER_PAGE, ADS_PER_PAGE)
     
     await callback.message.edit_text(
         "📝 Список рекламных объявлений:\n"
         "Выберите объявление для управления:",
-        reply_markup=get_ads_list_keyboard(ads, page=0)
+        reply_markup=get_ads_list_keyboard(ads, total, page=page)
     )
     await callback.answer()
 
 
+@router.callback_query(F.data == "list_ads")
+async def list_advertisements(callback: CallbackQuery, db: Database, is_admin: bool):
+    """Обработчик просмотра списка рекламных объявлений"""
+    if not is_admin:
+        await callback.answer("⛔ У вас нет прав на просмотр объявлений.", show_alert=True)
+        return
+    
+    await show_ads_page(callback, db, 0)
+
+
 @router.callback_query(F.data.startswith("page:"))
 async def navigate_pages(callback: CallbackQuery, db: Database):
     """Обработчик навигации по страницам списка объявлений"""
     page = int(callback.data.split(":")[1])
     
-    current_page_cache[callback.from_user.id] = page
-    
-    ads = await db.get_advertisements(callback.message.chat.id)
-    
-    if not ads:
-        await callback.message.edit_text(
-            "📝 В этом чате пока нет рекламных объявлений.\n\n"
-            "Нажмите кнопку 'Добавить объявление', чтобы создать новое.",
-            reply_markup=get_main_settings_keyboard()
-        )
-        await callback.answer()
-        return
-    
-    await callback.message.edit_text(
-        "📝 Список рекламных объявлений:\n"
-        "Выберите объявление для управления:",
-        reply_markup=get_ads_list_keyboard(ads, page=page)
-    )
-    await callback.answer()
+    await show_ads_page(callback, db, page)
 
 
 @router.callback_query(F.data == "back_to_list")
@@ -79,23 +90,114 @@ async def back_to_ads_list(callback: CallbackQuery, db: Database):
     """Обработчик возврата к списку объявлений"""
     page = current_page_cache.get(callback.from_user.id, 0)
     
-    ads = await db.get_advertisements(callback.message.chat.id)
+    await show_ads_page(callback, db, page)
+
+
+def parse_search_query(query: str) -> AdSearch:
+    """Разбирает поисковый запрос на слова и фильтры вида ключ:значение"""
+    search = AdSearch()
+    words = []
+    
+    for token in query.split():
+        key, _, value = token.partition(":")
+        key = key.lower()
+        value = value.lower()
+        
+        if key == "статус" and value:
+            if value not in SEARCH_STATUSES:
+                raise ValueError("Статус может быть только «вкл» или «выкл»")
+            search.is_active = SEARCH_STATUSES[value]
+        elif key == "медиа" and value:
+            if value not in SEARCH_MEDIA_TYPES:
+                raise ValueError("Тип медиа может быть только «фото», «видео» или «нет»")
+            search.media_type = SEARCH_MEDIA_TYPES[value]
+        elif key == "тема" and value:
+            if not value.isdigit():
+                raise ValueError("ID темы должен быть положительным числом")
+            search.topic_id = int(value)
+        else:
+            words.append(token)
     
-    if not ads:
-        await callback.message.edit_text(
-            "📝 В этом чате пока нет рекламных объявлений.\n\n"
-            "Нажмите кнопку 'Добавить объявление', чтобы создать новое.",
+    search.text = " ".join(words) or None
+    return search
+
+
+async def show_search_page(message_or_callback, db: Database, search: AdSearch, page: int):
+    """Показывает страницу результатов поиска объявлений"""
+    if isinstance(message_or_callback, CallbackQuery):
+        message = message_or_callback.message
+    else:
+        message = message_or_callback
+    
+    chat_id = message.chat.id
+    total = await db.count_search_results(chat_id, search)
+    page = max(0, min(page, (total - 1) // ADS_PER_PAGE))
+    ads = await db.search_advertisements(chat_id, search, page * ADS_PER_PAGE, ADS_PER_PAGE)
+    
+    if total:
+        text = f"🔍 Найдено объявлений: {total}\nВыберите объявление для управления:"
+    else:
+        text = "🔍 Ничего не найдено. Попробуйте изменить запрос."
+    keyboard = get_ads_list_keyboard(ads, total, page=page, page_callback="search_page")
+    
+    if isinstance(message_or_callback, CallbackQuery):
+        await message.edit_text(text, reply_markup=keyboard)
+        await message_or_callback.answer()
+    else:
+        await message.answer(text, reply_markup=keyboard)
+
+
+@router.callback_query(F.data == "search_ads")
+async def search_advertisements(callback: CallbackQuery, state: FSMContext, is_admin: bool):
+    """Обработчик начала поиска объявлений"""
+    if not is_admin:
+        await callback.answer("⛔ У вас нет прав на просмотр объявлений.", show_alert=True)
+        return
+    
+    await state.set_state(AdSearchStates.waiting_for_query)
+    
+    await callback.message.edit_text(SEARCH_HELP)
+    await callback.answer()
+
+
+@router.message(StateFilter(AdSearchStates.waiting_for_query))
+async def process_search_query(message: Message, db: Database, state: FSMContext):
+    """Обработчик получения поискового запроса"""
+    if message.text == "/cancel":
+        await state.set_state(None)
+        await message.answer(
+            "❌ Поиск отменён.",
             reply_markup=get_main_settings_keyboard()
         )
-        await callback.answer()
         return
     
-    await callback.message.edit_text(
-        "📝 Список рекламных объявлений:\n"
-        "Выберите объявление для управления:",
-        reply_markup=get_ads_list_keyboard(ads, page=page)
-    )
-    await callback.answer()
+    try:
+        search = parse_search_query(message.text or "")
+    except ValueError as e:
+        await message.answer(
+            f"❌ {str(e)}.\n"
+            "Пожалуйста, исправьте запрос.\n\n"
+            "Для отмены, введите /cancel."
+        )
+        return
+    
+    await state.set_state(None)
+    await state.update_data(ad_search=dataclasses.asdict(search))
+    
+    await show_search_page(message, db, search, 0)
+
+
+@router.callback_query(F.data.startswith("search_page:"))
+async def navigate_search_pages(callback: CallbackQuery, db: Database, state: FSMContext):
+    """Обработчик навигации по страницам результатов поиска"""
+    page = int(callback.data.split(":")[1])
+    
+    data = await state.get_data()
+    if not data.get("ad_search"):
+        await show_ads_page(callback, db, 0)
+        return
+    
+    await show_search_page(callback, db, AdSearch(**data["ad_search"]), page)
 
 
 @router.callback_query(F.data.startswith("ad:"))
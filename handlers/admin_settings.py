@@ -61,7 +61,7 @@ async def manage_admins(callback: CallbackQuery, is_admin: bool, chat_settings:
     if not chat_settings or not chat_settings.admin_ids:
         admin_list = "Список пуст"
     else:
-        admin_list = "\n".join([f"• {admin_id}" for admin_id in chat_settings.admin_ids])
+        admin_list = "\n".join([f"• {admin_id}" for admin_id in sorted(chat_settings.admin_ids)])
     
     message_text = (
         "👥 Управление администраторами бота\n\n"
@@ -84,7 +84,7 @@ async def admin_action(callback: CallbackQuery, db: Database, is_admin: bool, ch
         await callback.answer("⛔ У вас нет прав на использование этих настроек.", show_alert=True)
         return
     
-    action, admin_id = callback.data.split(":", 1)
+    _, action, admin_id = callback.data.split(":", 2)
     admin_id = int(admin_id)
     
     if not chat_settings:
@@ -92,9 +92,8 @@ async def admin_action(callback: CallbackQuery, db: Database, is_admin: bool, ch
         return
     
     if action == "remove_admin":
-        if admin_id in chat_settings.admin_ids:
-            chat_settings.admin_ids.remove(admin_id)
-            await db.save_chat_settings(chat_settings)
+        if await db.remove_chat_admin(chat_settings.chat_id, admin_id):
+            chat_settings.admin_ids.discard(admin_id)
             await callback.answer("✅ Администратор удален", show_alert=True)
         else:
             await callback.answer("❌ Администратор не найден", show_alert=True)
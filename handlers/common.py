@@ -1,11 +1,12 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from aiogram.filters import Command, CommandStart, ChatMemberUpdatedFilter, JOIN_TRANSITION
 from aiogram.enums import ParseMode
 
 from database.database import Database
 from database.models import ChatSettings
 from keyboards.inline import get_main_settings_keyboard
+from utils.admin_roster import AdminRoster
 
 router = Router()
 
@@ -26,14 +27,15 @@ async def cmd_start(message: Message):
 
 
 @router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=JOIN_TRANSITION))
-async def bot_added_to_group(event, bot: Bot, db: Database):
+async def bot_added_to_group(event, bot: Bot, db: Database, admin_roster: AdminRoster):
     """Обработчик события добавления бота в группу"""
     chat_id = event.chat.id
+    admin_roster.invalidate(chat_id)
     
     chat_settings = ChatSettings(
         chat_id=chat_id,
         is_enabled=True,
-        admin_ids=[event.from_user.id] 
+        admin_ids={event.from_user.id}
     )
     await db.save_chat_settings(chat_settings)
     
@@ -47,6 +49,22 @@ async def bot_added_to_group(event, bot: Bot, db: Database):
     )
 
 
+@router.my_chat_member()
+async def bot_status_changed(event: ChatMemberUpdated, admin_roster: AdminRoster):
+    """Сбрасывает список администраторов чата при изменении статуса бота"""
+    admin_roster.invalidate(event.chat.id)
+
+
+@router.chat_member()
+async def chat_member_updated(event: ChatMemberUpdated, admin_roster: AdminRoster):
+    """Обновляет закэшированный список администраторов при изменении статуса участника"""
+    admin_roster.update_member(
+        event.chat.id,
+        event.new_chat_member.user.id,
+        event.new_chat_member.status
+    )
+
+
 @router.message(Command("reklama_settings"))
 async def cmd_reklama_settings(message: Message, is_admin: bool):
     """Обработчик команды /reklama_settings"""
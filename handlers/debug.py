@@ -0,0 +1,111 @@
+import html
+from typing import List
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from config import config
+from database.database import Database
+from database.profiler import SORT_KEYS, QueryStats, normalize_sql
+
+router = Router()
+
+# Команды доступны только пользователям из DEBUG_USER_IDS и только в личных сообщениях
+router.message.filter(F.chat.type == "private", F.from_user.id.in_(config.DEBUG_USER_IDS))
+
+MESSAGE_LIMIT = 4000
+SQL_PREVIEW_LIMIT = 400
+DEFAULT_TOP = 10
+MAX_TOP = 50
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} мс"
+
+
+def _sql_preview(sql: str) -> str:
+    sql = normalize_sql(sql)
+    if len(sql) > SQL_PREVIEW_LIMIT:
+        sql = sql[:SQL_PREVIEW_LIMIT] + "…"
+    return html.escape(sql)
+
+
+def _format_query(position: int, stats: QueryStats, plan: List[str]) -> str:
+    lines = [
+        f"<b>{position}. {html.escape(stats.method or '-')}</b> — "
+        f"{stats.calls} выз., всего {_ms(stats.total)}, ср. {_ms(stats.avg)}, макс. {_ms(stats.max)}",
+        f"строк: {stats.rows / stats.calls:.1f} на вызов, ожидание соединения: {_ms(stats.acquire / stats.calls)}",
+        f"<pre>{_sql_preview(stats.sql)}</pre>",
+    ]
+    if plan:
+        lines.append(f"<pre>{html.escape(chr(10).join(plan))}</pre>")
+    return "\n".join(lines)
+
+
+def _join_limited(header: str, blocks: List[str]) -> str:
+    """Склеивает блоки, пока сообщение укладывается в лимит Telegram"""
+    text = header
+    for block in blocks:
+        if len(text) + len(block) + 2 > MESSAGE_LIMIT:
+            break
+        text += "\n\n" + block
+    return text
+
+
+@router.message(Command("db_top"))
+async def cmd_db_top(message: Message, command: CommandObject, db: Database):
+    """Показывает самые затратные запросы к базе: /db_top [N] [total|calls|avg|max|rows] или /db_top reset"""
+    profiler = db.profiler
+    args = (command.args or "").split()
+
+    if args[:1] == ["reset"]:
+        profiler.reset()
+        await message.answer("Статистика запросов сброшена")
+        return
+
+    limit = DEFAULT_TOP
+    sort = "total"
+    for arg in args:
+        if arg.isdigit():
+            limit = max(1, min(int(arg), MAX_TOP))
+        elif arg in SORT_KEYS:
+            sort = arg
+        else:
+            await message.answer(f"Использование: /db_top [N] [{'|'.join(SORT_KEYS)}] или /db_top reset")
+            return
+
+    if not profiler.enabled:
+        slowest = sorted(profiler.slow, key=lambda entry: entry.elapsed, reverse=True)[:limit]
+        blocks = [
+            f"<b>{position}. {html.escape(entry.method)}</b> — {_ms(entry.elapsed)}, строк: {entry.rows}\n"
+            f"<pre>{_sql_preview(entry.sql)}</pre>\n"
+            f"<pre>{html.escape(chr(10).join(entry.plan))}</pre>"
+            for position, entry in enumerate(slowest, 1)
+        ]
+        header = (
+            "Профилирование запросов выключено (DB_PROFILE). "
+            f"Медленных запросов с запуска: {profiler.slow_count}"
+        )
+        await message.answer(_join_limited(header, blocks))
+        return
+
+    top = profiler.top(limit, sort)
+    if not top:
+        await message.answer("Запросов к базе пока не было")
+        return
+
+    blocks = []
+    for position, stats in enumerate(top, 1):
+        plan = profiler.plans.get(stats.sql)
+        if plan is None:
+            # Для горячих, но не медленных запросов план снимается по последним параметрам
+            plan = profiler.plans[stats.sql] = await db.explain(stats.sql, stats.last_params)
+        blocks.append(_format_query(position, stats, plan))
+
+    total_queries = sum(stats.calls for stats in profiler.queries.values())
+    header = (
+        f"<b>Топ-{len(top)} запросов по {sort}</b>\n"
+        f"Всего запросов: {total_queries}, медленных (≥ {config.DB_SLOW_QUERY_MS} мс): {profiler.slow_count}"
+    )
+    await message.answer(_join_limited(header, blocks))
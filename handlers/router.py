@@ -1,12 +1,13 @@
 from aiogram import Router
 
-from handlers import common, admin_settings, ad_creation, ad_management
+from handlers import common, admin_settings, ad_creation, ad_management, debug
 
 
 def setup_routers() -> Router:
     """Настраивает и возвращает главный роутер с подключенными дочерними роутерами"""
     router = Router()
     
+    router.include_router(debug.router)
     router.include_router(common.router)
     router.include_router(admin_settings.router)
     router.include_router(ad_creation.router)
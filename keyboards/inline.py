@@ -1,7 +1,10 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from typing import List, Dict, Optional
 
-from database.models import Advertisement
+from database.models import AdvertisementPreview
+
+
+ADS_PER_PAGE = 5
 
 
 def get_main_settings_keyboard() -> InlineKeyboardMarkup:
@@ -14,14 +17,19 @@ def get_main_settings_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_ads_list_keyboard(ads: List[Advertisement], page: int = 0, ads_per_page: int = 5) -> InlineKeyboardMarkup:
+def get_ads_list_keyboard(
+    ads: List[AdvertisementPreview],
+    total: int,
+    page: int = 0,
+    ads_per_page: int = ADS_PER_PAGE,
+    page_callback: str = "page"
+) -> InlineKeyboardMarkup:
     buttons = []
     
     start_idx = page * ads_per_page
-    end_idx = min(start_idx + ads_per_page, len(ads))
+    end_idx = start_idx + len(ads)
     
-    for i in range(start_idx, end_idx):
-        ad = ads[i]
+    for i, ad in enumerate(ads, start=start_idx):
         ad_text = ad.text[:30] + "..." if len(ad.text) > 30 else ad.text
         status = "✅" if ad.is_active else "❌"
         buttons.append([
@@ -35,17 +43,20 @@ def get_ads_list_keyboard(ads: List[Advertisement], page: int = 0, ads_per_page:
     
     if page > 0:
         nav_buttons.append(
-            InlineKeyboardButton(text="◀️ Назад", callback_data=f"page:{page-1}")
+            InlineKeyboardButton(text="◀️ Назад", callback_data=f"{page_callback}:{page-1}")
         )
     
-    if end_idx < len(ads):
+    if end_idx < total:
         nav_buttons.append(
-            InlineKeyboardButton(text="Вперед ▶️", callback_data=f"page:{page+1}")
+            InlineKeyboardButton(text="Вперед ▶️", callback_data=f"{page_callback}:{page+1}")
         )
     
     if nav_buttons:
         buttons.append(nav_buttons)
     
+    buttons.append([
+        InlineKeyboardButton(text="🔍 Поиск", callback_data="search_ads")
+    ])
     buttons.append([
         InlineKeyboardButton(text="↩️ Назад в меню", callback_data="back_to_main")
     ])
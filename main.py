@@ -3,14 +3,22 @@ import logging
 import sys
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 
 from config import config
 from database.database import Database
+from database.fsm_storage import SQLiteStorage
+from database.profiler import setup_slow_query_log
 from handlers.router import setup_routers
-from middlewares.router import setup_middlewares
+from middlewares.router import setup_middlewares, setup_request_middlewares
+from utils import metrics
+from utils.admin_roster import AdminRoster
+from utils.rate_limiter import RateLimiter
 from utils.scheduler import AdvertisementScheduler
+from utils.update_filter import PrefilteringSession, UpdatePrefilter
+from utils.webhook import run_webhook
 
 
 logging.basicConfig(
@@ -26,23 +34,71 @@ logger = logging.getLogger(__name__)
 
 async def main():
     logger.info("Запуск бота...")
+    if config.DB_SLOW_QUERY_LOG:
+        setup_slow_query_log(config.DB_SLOW_QUERY_LOG)
     db = Database()
     await db.create_tables()
     logger.info("Таблицы базы данных созданы")
+    cached_chats = await db.warm_chat_settings_cache()
+    logger.info(f"Загружено в кэш настроек чатов: {cached_chats}")
+    storage = SQLiteStorage(db)
+    active_scenarios = await storage.start()
+    logger.info(f"Восстановлено незавершённых сценариев: {active_scenarios}")
+    api = PRODUCTION
+    if config.TELEGRAM_API_URL:
+        api = TelegramAPIServer.from_base(config.TELEGRAM_API_URL)
+        logger.info(f"Bot API: {config.TELEGRAM_API_URL}")
+    prefilter = None
+    session = AiohttpSession(api=api)
+    if config.PREFILTER_UPDATES:
+        prefilter = UpdatePrefilter(storage.has_state)
+        if config.RUN_MODE == "polling":
+            session = PrefilteringSession(prefilter, api=api)
     bot = Bot(
         token=config.BOT_TOKEN, 
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    limiter = RateLimiter()
+    setup_request_middlewares(bot, limiter)
+    dp = Dispatcher(storage=storage)
     dp["db"] = db
     dp["bot"] = bot
-    setup_middlewares(dp, db)
+    admin_roster = AdminRoster()
+    dp["admin_roster"] = admin_roster
+    setup_middlewares(dp, db, admin_roster)
     dp.include_router(setup_routers())
-    scheduler = AdvertisementScheduler(bot, db)
+    allowed_updates = dp.resolve_used_update_types()
+    logger.info(f"Получаемые типы обновлений: {', '.join(allowed_updates)}")
+    scheduler = AdvertisementScheduler(bot, db, limiter=limiter)
     await scheduler.start()
+    metrics_runner = None
+    if config.METRICS_ENABLED:
+        metrics.REGISTRY.register_cache("chat_settings", db.chat_settings_cache)
+        metrics.REGISTRY.register_cache("ads", db.ad_cache)
+        metrics.REGISTRY.register_cache("fsm", storage.cache)
+        metrics.REGISTRY.register_cache("admin_roster", admin_roster.cache)
+        metrics.REGISTRY.gauge_callback(
+            "reklama_db_queries_total", "Запросы к SQLite", lambda: db.query_count, kind="counter"
+        )
+        metrics.REGISTRY.gauge_callback(
+            "reklama_db_slow_queries_total", "Запросы к SQLite дольше DB_SLOW_QUERY_MS",
+            lambda: db.profiler.slow_count, kind="counter"
+        )
+        metrics_runner = await metrics.start_metrics_server()
     logger.info("Бот запущен")
-    await dp.start_polling(bot, skip_updates=True)
-    await scheduler.stop()
+    try:
+        if config.RUN_MODE == "webhook":
+            await run_webhook(dp, bot, allowed_updates, prefilter)
+        else:
+            await dp.start_polling(bot, skip_updates=True, allowed_updates=allowed_updates)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await scheduler.stop()
+        await storage.close()
+        await db.close()
+        logger.info("Соединение с базой данных закрыто")
 
 
 if __name__ == "__main__":
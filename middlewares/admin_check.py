@@ -1,14 +1,27 @@
-from typing import Callable, Dict, Any, Awaitable, Optional
+from typing import Callable, Dict, Any, Awaitable, Optional, Tuple
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
 from aiogram.exceptions import TelegramAPIError
 
 from database.database import Database
+from database.models import ChatSettings
+from utils.admin_roster import AdminRoster
+
+
+# Данные, которые вычисляет middleware. Если обработчик не принимает ни одного
+# из этих аргументов, проверка прав не выполняется вовсе.
+ADMIN_DATA_KEYS = frozenset({"is_admin", "chat_settings"})
 
 
 class AdminCheckMiddleware(BaseMiddleware):
-    def __init__(self, db: Database):
+    """Вычисляет is_admin и chat_settings для обработчиков, которым они нужны"""
+    
+    # Middleware внутренний: он вызывается только после того, как фильтры выбрали
+    # обработчик, поэтому сообщения, не подошедшие ни одному обработчику, сюда не попадают.
+    
+    def __init__(self, db: Database, admin_roster: AdminRoster):
         self.db = db
+        self.admin_roster = admin_roster
         super().__init__()
     
     async def __call__(
@@ -17,6 +30,14 @@ class AdminCheckMiddleware(BaseMiddleware):
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
+        handler_object = data.get("handler")
+        if (
+            handler_object is not None
+            and not handler_object.varkw
+            and not ADMIN_DATA_KEYS & handler_object.params
+        ):
+            return await handler(event, data)
+            
         if isinstance(event, Message):
             chat_id = event.chat.id
             from_user_id = event.from_user.id
@@ -32,37 +53,34 @@ class AdminCheckMiddleware(BaseMiddleware):
             data["is_admin"] = True
             return await handler(event, data)
         
+        is_admin, chat_settings = await self._resolve(data["bot"], chat_id, from_user_id)
+        data["is_admin"] = is_admin
+        data["chat_settings"] = chat_settings
+        
+        return await handler(event, data)
+    
+    async def _resolve(self, bot, chat_id: int, from_user_id: int) -> Tuple[bool, Optional[ChatSettings]]:
+        """Определяет, является ли пользователь администратором чата"""
         chat_settings = await self.db.get_chat_settings(chat_id)
         
-        if chat_settings and chat_settings.admin_ids and from_user_id in chat_settings.admin_ids:
-            data["is_admin"] = True
-            data["chat_settings"] = chat_settings
-            return await handler(event, data)
+        if chat_settings and from_user_id in chat_settings.admin_ids:
+            return True, chat_settings
         
         try:
-            bot = data["bot"]
-            chat_member = await bot.get_chat_member(chat_id, from_user_id)
-            
-            is_admin = chat_member.status in ("administrator", "creator")
-            
-            if is_admin:
-                if not chat_settings:
-                    from database.models import ChatSettings
-                    chat_settings = ChatSettings(
-                        chat_id=chat_id,
-                        is_enabled=True,
-                        admin_ids=[from_user_id]
-                    )
-                    await self.db.save_chat_settings(chat_settings)
-                elif chat_settings.admin_ids and from_user_id not in chat_settings.admin_ids:
-                    chat_settings.admin_ids.append(from_user_id)
-                    await self.db.save_chat_settings(chat_settings)
-            
-            data["is_admin"] = is_admin
-            data["chat_settings"] = chat_settings
-            
-            return await handler(event, data)
-            
+            is_admin = await self.admin_roster.is_admin(bot, chat_id, from_user_id)
         except TelegramAPIError:
-            data["is_admin"] = False
-            return await handler(event, data) 
\ No newline at end of file
+            return False, chat_settings
+            
+        if is_admin:
+            if not chat_settings:
+                chat_settings = ChatSettings(
+                    chat_id=chat_id,
+                    is_enabled=True,
+                    admin_ids={from_user_id}
+                )
+                await self.db.save_chat_settings(chat_settings)
+            else:
+                await self.db.add_chat_admin(chat_id, from_user_id)
+                chat_settings.admin_ids.add(from_user_id)
+        
+        return is_admin, chat_settings
\ No newline at end of file
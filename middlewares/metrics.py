@@ -0,0 +1,53 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from utils import metrics
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Замеряет обработку обновлений выбранным обработчиком с меткой модуля, где он объявлен"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        router = "unknown"
+        if handler_object is not None:
+            router = handler_object.callback.__module__.rsplit(".", 1)[-1]
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.HANDLER_ERRORS.labels(router).inc()
+            raise
+        finally:
+            metrics.HANDLER_SECONDS.labels(router).observe(time.perf_counter() - started)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Замеряет запросы к Bot API по методам (без ожидания в RateLimiter)"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.BOT_API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            metrics.BOT_API_SECONDS.labels(name).observe(time.perf_counter() - started)
@@ -0,0 +1,38 @@
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from utils.rate_limiter import RateLimiter
+
+
+# Методы Bot API, на которые распространяются лимиты Telegram на отправку сообщений
+LIMITED_METHOD_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Пропускает исходящие сообщения бота через RateLimiter"""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not method.__api_method__.startswith(LIMITED_METHOD_PREFIXES):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            chat_id = None
+
+        await self.limiter.acquire(chat_id)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            self.limiter.block(chat_id, e.retry_after)
+            raise
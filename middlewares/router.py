@@ -1,10 +1,25 @@
 from aiogram import Bot, Dispatcher
 from aiogram.client.session.aiohttp import AiohttpSession
 
+from config import config
 from database.database import Database
 from middlewares.admin_check import AdminCheckMiddleware
+from middlewares.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware
+from middlewares.rate_limit import RateLimitMiddleware
+from utils.admin_roster import AdminRoster
+from utils.rate_limiter import RateLimiter
 
 
-def setup_middlewares(dp: Dispatcher, db: Database):
-    dp.message.middleware(AdminCheckMiddleware(db))
-    dp.callback_query.middleware(AdminCheckMiddleware(db)) 
\ No newline at end of file
+def setup_middlewares(dp: Dispatcher, db: Database, admin_roster: AdminRoster):
+    if config.METRICS_ENABLED:
+        # Регистрируется первым, поэтому в замер входит и проверка прав
+        for observer in (dp.message, dp.callback_query, dp.my_chat_member, dp.chat_member):
+            observer.middleware(HandlerMetricsMiddleware())
+    dp.message.middleware(AdminCheckMiddleware(db, admin_roster))
+    dp.callback_query.middleware(AdminCheckMiddleware(db, admin_roster))
+
+
+def setup_request_middlewares(bot: Bot, limiter: RateLimiter):
+    bot.session.middleware(RateLimitMiddleware(limiter))
+    if config.METRICS_ENABLED:
+        bot.session.middleware(ApiMetricsMiddleware()) 
\ No newline at end of file
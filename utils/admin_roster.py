@@ -0,0 +1,68 @@
+import asyncio
+from typing import Dict, FrozenSet
+
+from aiogram import Bot
+
+from config import config
+from database.cache import LRUCache, MISSING
+
+
+ADMIN_STATUSES = ("administrator", "creator")
+
+
+class AdminRoster:
+    """Кэш списков администраторов чатов, полученных одним запросом getChatAdministrators"""
+
+    def __init__(
+        self,
+        ttl: float = config.ADMIN_ROSTER_TTL,
+        maxsize: int = config.ADMIN_ROSTER_CACHE_SIZE
+    ):
+        self.cache = LRUCache(maxsize, ttl)
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    async def get_admins(self, bot: Bot, chat_id: int) -> FrozenSet[int]:
+        """Возвращает ID администраторов чата; одновременные промахи ждут один общий запрос"""
+        admins = self.cache.get(chat_id)
+        if admins is not MISSING:
+            return admins
+
+        future = self._inflight.get(chat_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(bot, chat_id))
+            self._inflight[chat_id] = future
+            future.add_done_callback(lambda done: self._forget(chat_id, done))
+
+        return await asyncio.shield(future)
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        return user_id in await self.get_admins(bot, chat_id)
+
+    async def _fetch(self, bot: Bot, chat_id: int) -> FrozenSet[int]:
+        members = await bot.get_chat_administrators(chat_id)
+        admins = frozenset(member.user.id for member in members)
+        self.cache.set(chat_id, admins)
+        return admins
+
+    def _forget(self, chat_id: int, future: asyncio.Future):
+        if self._inflight.get(chat_id) is future:
+            del self._inflight[chat_id]
+        if not future.cancelled():
+            # Ошибку уже получили ожидающие; помечаем её полученной, чтобы asyncio не ругался
+            future.exception()
+
+    def update_member(self, chat_id: int, user_id: int, status: str):
+        """Обновляет закэшированный список по событию chat_member"""
+        admins = self.cache.get(chat_id)
+        if admins is MISSING:
+            return
+
+        if status in ADMIN_STATUSES:
+            admins = admins | {user_id}
+        else:
+            admins = admins - {user_id}
+        self.cache.set(chat_id, admins)
+
+    def invalidate(self, chat_id: int):
+        """Сбрасывает список администраторов чата (он будет запрошен заново)"""
+        self.cache.invalidate(chat_id)
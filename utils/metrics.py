@@ -0,0 +1,319 @@
+import functools
+import inspect
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+from config import config
+
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (в секундах) для запросов к базе и Bot API
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Для опоздания рассылки относительно расписания
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Метрики обновляются на горячем пути только сложением чисел: разбор меток,
+# форматирование и подсчёт долей откладываются до запроса /metrics.
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """Семейство метрик с одинаковым именем; значения с разными метками создаются через labels()"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: str) -> Any:
+        """Возвращает значение для набора меток; его стоит сохранить, если метки не меняются"""
+        value = self._values.get(values)
+        if value is None:
+            value = self._values[values] = self._new_value()
+        return value
+
+    def _new_value(self) -> Any:
+        raise NotImplementedError
+
+    def _samples(self, labels: Tuple[str, ...], value: Any) -> Iterable[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value.value)}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in list(self._values.items()):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_value(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self, labels: Tuple[str, ...], value: _HistogramValue) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), value.counts):
+            cumulative += count
+            yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(value.sum)}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {value.count}"
+
+
+class CallbackMetric(Metric):
+    """Метрика, значение которой вычисляется только при запросе /metrics"""
+
+    def __init__(self, name: str, documentation: str, kind: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.error(f"Ошибка при вычислении метрики {self.name}: {e}", exc_info=True)
+            return []
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(value)}",
+        ]
+
+
+class CacheMetrics:
+    """Попадания, промахи, доля попаданий и размер зарегистрированных LRUCache"""
+
+    def __init__(self):
+        self.caches: Dict[str, Any] = {}
+
+    def render(self) -> List[str]:
+        families = (
+            ("reklama_cache_hits_total", "counter", "Попадания в кэш", lambda cache: cache.hits),
+            ("reklama_cache_misses_total", "counter", "Промахи кэша", lambda cache: cache.misses),
+            ("reklama_cache_hit_ratio", "gauge", "Доля попаданий в кэш с момента запуска", self._hit_ratio),
+            ("reklama_cache_entries", "gauge", "Число записей в кэше", len),
+        )
+        lines = []
+        for name, kind, documentation, getter in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for cache_name, cache in self.caches.items():
+                lines.append(f"{name}{_format_labels(('cache',), (cache_name,))} {_format_value(getter(cache))}")
+        return lines
+
+    @staticmethod
+    def _hit_ratio(cache: Any) -> float:
+        total = cache.hits + cache.misses
+        return cache.hits / total if total else 0.0
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и их вывод в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self.caches = CacheMetrics()
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, callback: Callable[[], float], kind: str = "gauge"):
+        """Регистрирует метрику, которая читается из callback при каждом запросе /metrics"""
+        self.register(CallbackMetric(name, documentation, kind, callback))
+
+    def register_cache(self, name: str, cache: Any):
+        """Добавляет LRUCache в метрики кэшей под меткой cache=name"""
+        self.caches.caches[name] = cache
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        lines.extend(self.caches.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+SCHEDULER_TICK_SECONDS = REGISTRY.histogram(
+    "reklama_scheduler_tick_seconds", "Длительность одной рассылки планировщика",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+SCHEDULER_TICK_ADS = REGISTRY.gauge(
+    "reklama_scheduler_tick_ads", "Объявления в последней рассылке: к отправке, отправлено, ошибки, отложено",
+    ("result",)
+)
+SCHEDULER_ADS_TOTAL = REGISTRY.counter(
+    "reklama_scheduler_ads_total", "Объявления, обработанные планировщиком, по результату", ("result",)
+)
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    "reklama_scheduler_lag_seconds", "Опоздание фактической отправки относительно времени по расписанию",
+    buckets=LAG_BUCKETS
+)
+BOT_API_SECONDS = REGISTRY.histogram(
+    "reklama_bot_api_request_seconds", "Длительность запросов к Bot API по методам", ("method",)
+)
+BOT_API_ERRORS = REGISTRY.counter(
+    "reklama_bot_api_errors_total", "Ошибки запросов к Bot API по методам и типу ошибки", ("method", "error")
+)
+DB_METHOD_SECONDS = REGISTRY.histogram(
+    "reklama_db_method_seconds", "Длительность методов Database (включая ответы из кэша)", ("method",)
+)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "reklama_handler_seconds", "Длительность обработки обновлений по модулям обработчиков", ("router",)
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "reklama_handler_errors_total", "Исключения в обработчиках по модулям", ("router",)
+)
+
+
+def instrument_methods(
+    histogram: Histogram,
+    exclude: Sequence[str] = ("connect", "close")
+) -> Callable[[type], type]:
+    """Декоратор класса: замеряет время каждого публичного async-метода с меткой method"""
+    def decorate(cls: type) -> type:
+        if not config.METRICS_ENABLED:
+            return cls
+
+        for name, func in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not inspect.iscoroutinefunction(func):
+                continue
+            setattr(cls, name, _timed(func, histogram.labels(name)))
+        return cls
+    return decorate
+
+
+def _timed(func: Callable, value: _HistogramValue) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            value.observe(time.perf_counter() - started)
+    return wrapper
+
+
+async def start_metrics_server(
+    host: str = config.METRICS_HOST,
+    port: int = config.METRICS_PORT,
+    registry: Optional[MetricsRegistry] = None
+) -> web.AppRunner:
+    """Запускает HTTP-сервер с метриками на /metrics"""
+    registry = registry or REGISTRY
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
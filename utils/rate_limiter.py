@@ -0,0 +1,122 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from config import config
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не более capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now: float) -> float:
+        """Резервирует один токен и возвращает, сколько секунд нужно подождать перед запросом.
+
+        Баланс может уйти в минус: так ожидающие запросы выстраиваются в очередь
+        и не будят друг друга впустую.
+        """
+        self._refill(now)
+        self.tokens -= 1
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд пришлось бы ждать reserve() сейчас (токен не резервируется)"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def block(self, now: float, seconds: float):
+        """Запрещает запросы на указанное время (ответ Telegram retry_after)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class RateLimiter:
+    """Общий лимит бота и отдельные лимиты для каждого чата"""
+
+    def __init__(
+        self,
+        global_rate: float = config.RATE_LIMIT_GLOBAL_PER_SECOND,
+        group_rate: float = config.RATE_LIMIT_GROUP_PER_MINUTE / 60,
+        private_rate: float = config.RATE_LIMIT_PRIVATE_PER_SECOND,
+        chat_burst: float = config.RATE_LIMIT_CHAT_BURST,
+        prune_interval: float = 60.0
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.group_rate = group_rate
+        self.private_rate = private_rate
+        self.chat_burst = chat_burst
+        self.prune_interval = prune_interval
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._next_prune = time.monotonic() + prune_interval
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательные ID у групп и каналов, положительные — у личных чатов
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float):
+        """Удаляет вёдра чатов, которые давно не использовались"""
+        if now < self._next_prune:
+            return
+        self._next_prune = now + self.prune_interval
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle(now)]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    async def acquire(self, chat_id: Optional[int] = None):
+        """Ждёт, пока запрос в чат можно будет отправить без превышения лимитов"""
+        if chat_id is not None:
+            now = time.monotonic()
+            self._prune(now)
+            wait = self._chat_bucket(chat_id).reserve(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        wait = self.global_bucket.reserve(time.monotonic())
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def wait_time(self, chat_id: int) -> float:
+        """Сколько секунд acquire(chat_id) ждал бы сейчас лимита чата или запрета retry_after.
+
+        Общий лимит учитывается только запретом: его ожидание составляет доли секунды.
+        """
+        now = time.monotonic()
+        wait = max(0.0, self.global_bucket.blocked_until - now)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is not None:
+            wait = max(wait, bucket.wait_time(now))
+        return wait
+
+    def block(self, chat_id: Optional[int], seconds: float):
+        """Приостанавливает отправку в чат (или все запросы бота) после ответа retry_after"""
+        now = time.monotonic()
+        if chat_id is None:
+            self.global_bucket.block(now, seconds)
+        else:
+            self._chat_bucket(chat_id).block(now, seconds)
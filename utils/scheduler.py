@@ -1,30 +1,77 @@
 import asyncio
+import heapq
 import logging
+import math
 import time
-from typing import Dict, Any, Optional, List, Callable
+from typing import Dict, Any, Optional, List, Callable, Tuple, Set
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.exceptions import TelegramAPIError
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
 
-from database.database import Database
-from database.models import Advertisement
+from config import config
+from database.database import Database, CHANGE_AD, CHANGE_CHAT
+from database.models import AdvertisementRecord
+from utils import metrics
+from utils.rate_limiter import RateLimiter
 
 
 logger = logging.getLogger(__name__)
 
+# Исходы объявлений в рассылке (см. reklama_scheduler_ads_total)
+TICK_RESULTS = ("sent", "failed", "deferred", "skipped")
+
 
 class AdvertisementScheduler:
-    def __init__(self, bot: Bot, db: Database, check_interval: int = 60):
+    def __init__(
+        self,
+        bot: Bot,
+        db: Database,
+        check_interval: int = 60,
+        resync_interval: int = config.SCHEDULER_RESYNC_INTERVAL,
+        concurrency: int = config.SCHEDULER_CONCURRENCY,
+        flush_size: int = config.SCHEDULER_FLUSH_SIZE,
+        limiter: Optional[RateLimiter] = None
+    ):
         self.bot = bot
         self.db = db
+        # Лимитер запросов бота: отправки, которым пришлось бы ждать лимита чата
+        # или retry_after, откладываются, а не ждут в нём
+        self.limiter = limiter
         self.check_interval = check_interval
+        self.resync_interval = resync_interval
+        self.concurrency = max(1, concurrency)
+        self.flush_size = max(1, flush_size)
         self.task: Optional[asyncio.Task] = None
         self.is_running = False
+        # Очередь с приоритетом (время отправки, ID объявления). Устаревшие записи
+        # не удаляются из кучи сразу, а пропускаются при сверке с _due_at.
+        self._queue: List[Tuple[int, int]] = []
+        self._due_at: Dict[int, int] = {}
+        self._wakeup = asyncio.Event()
+        self._next_resync = 0.0
+        # Объявления и чаты, изменённые во время текущей рассылки: их отправка
+        # пропускается, а новое расписание загружается из базы отдельной задачей.
+        self._revoked_ads: Set[int] = set()
+        self._revoked_chats: Set[int] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        # Успешные отправки (ID, время), ещё не записанные в базу. Пишутся одной
+        # транзакцией в конце каждой рассылки или при накоплении flush_size штук,
+        # поэтому после сбоя повторно уйдут не более чем отправки одного такого окна.
+        self._pending_sent: List[Tuple[int, int]] = []
+        # Итоги текущей рассылки для метрик: sent, failed, deferred, skipped
+        self._tick_results: Dict[str, int] = dict.fromkeys(TICK_RESULTS, 0)
         
     async def start(self):
         if self.is_running:
             return
             
+        await self._load_schedule()
+        self.db.add_change_listener(self._on_change)
+        metrics.REGISTRY.gauge_callback(
+            "reklama_scheduler_scheduled_ads",
+            "Объявления в расписании планировщика",
+            lambda: len(self._due_at)
+        )
         self.is_running = True
         self.task = asyncio.create_task(self._scheduler_loop())
         logger.info("Планировщик рекламы запущен")
@@ -34,6 +81,9 @@ class AdvertisementScheduler:
             return
             
         self.is_running = False
+        self.db.remove_change_listener(self._on_change)
+        for refresh_task in list(self._refresh_tasks):
+            refresh_task.cancel()
         if self.task:
             self.task.cancel()
             try:
@@ -41,38 +91,267 @@ class AdvertisementScheduler:
             except asyncio.CancelledError:
                 pass
             self.task = None
+        # Ошибка записи не должна прерывать остановку бота: база и хранилище FSM
+        # закрываются после планировщика
+        try:
+            await self._flush_sent()
+        except Exception as e:
+            logger.error(
+                f"Не удалось записать время отправки {len(self._pending_sent)} объявлений: {e}",
+                exc_info=True
+            )
         logger.info("Планировщик рекламы остановлен")
+    
+    def schedule(self, ad_id: int, due_at: int):
+        """Ставит объявление в очередь на отправку в указанное время"""
+        self._due_at[ad_id] = due_at
+        heapq.heappush(self._queue, (due_at, ad_id))
+        self._wakeup.set()
+    
+    def unschedule(self, ad_id: int):
+        """Убирает объявление из очереди на отправку"""
+        self._due_at.pop(ad_id, None)
+    
+    def _on_change(self, kind: str, object_id: int):
+        """Реагирует на изменение объявления или настроек чата в базе данных"""
+        if kind == CHANGE_AD:
+            self.unschedule(object_id)
+            self._revoked_ads.add(object_id)
+            self._spawn_refresh(self._refresh_ad(object_id))
+        elif kind == CHANGE_CHAT:
+            self._revoked_chats.add(object_id)
+            self._spawn_refresh(self._refresh_chat(object_id))
+    
+    def _spawn_refresh(self, coro):
+        refresh_task = asyncio.create_task(coro)
+        self._refresh_tasks.add(refresh_task)
+        refresh_task.add_done_callback(self._refresh_tasks.discard)
+    
+    async def _refresh_ad(self, ad_id: int):
+        """Перечитывает расписание одного объявления"""
+        try:
+            schedule = await self.db.get_schedule(int(time.time()), ad_id=ad_id)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении расписания объявления {ad_id}: {e}", exc_info=True)
+            return
+            
+        if schedule:
+            self.schedule(ad_id, schedule[0][1])
+        else:
+            self.unschedule(ad_id)
+    
+    async def _refresh_chat(self, chat_id: int):
+        """Перечитывает расписание объявлений чата (объявления выключенного чата отсеются при отправке)"""
+        try:
+            schedule = await self.db.get_schedule(int(time.time()), chat_id=chat_id)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении расписания чата {chat_id}: {e}", exc_info=True)
+            return
+            
+        for ad_id, due_at in schedule:
+            self.schedule(ad_id, due_at)
+    
+    async def _load_schedule(self):
+        """Загружает расписание всех активных объявлений из базы данных"""
+        current_time = int(time.time())
+        schedule = await self.db.get_schedule(current_time)
+        
+        self._queue = [(due_at, ad_id) for ad_id, due_at in schedule]
+        heapq.heapify(self._queue)
+        self._due_at = {ad_id: due_at for ad_id, due_at in schedule}
+        self._next_resync = time.monotonic() + self.resync_interval
+        logger.debug(f"В расписание загружено объявлений: {len(self._queue)}")
+    
+    def _next_due(self) -> Optional[int]:
+        """Возвращает время ближайшей отправки, отбрасывая устаревшие записи очереди"""
+        while self._queue:
+            due_at, ad_id = self._queue[0]
+            if self._due_at.get(ad_id) == due_at:
+                return due_at
+            heapq.heappop(self._queue)
+        return None
+    
+    def _pop_due(self, current_time: int) -> List[int]:
+        """Извлекает из очереди все объявления, время отправки которых наступило"""
+        due_ids = []
+        while True:
+            due_at = self._next_due()
+            if due_at is None or due_at > current_time:
+                return due_ids
+            _, ad_id = heapq.heappop(self._queue)
+            del self._due_at[ad_id]
+            due_ids.append(ad_id)
+    
+    def _reschedule(self, ad: AdvertisementRecord, due_at: int):
+        """Планирует следующую отправку объявления, если срок его показа ещё не истёк"""
+        if ad.expires_at is not None and due_at > ad.expires_at:
+            self.unschedule(ad.id)
+        else:
+            self.schedule(ad.id, due_at)
+    
+    async def _sleep(self, delay: float):
+        """Ждёт указанное время или досрочного пробуждения через schedule()"""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            pass
         
     async def _scheduler_loop(self):
         while self.is_running:
             try:
-                await self._check_and_send_ads()
+                if time.monotonic() >= self._next_resync:
+                    await self._load_schedule()
+                    
+                next_due = self._next_due()
+                now = time.time()
+                
+                if next_due is not None and next_due <= now:
+                    await self._check_and_send_ads()
+                    continue
+                    
+                delay = self._next_resync - time.monotonic()
+                if next_due is not None:
+                    delay = min(delay, next_due - now)
+                await self._sleep(delay)
             except Exception as e:
                 logger.error(f"Ошибка при проверке и отправке рекламы: {e}", exc_info=True)
-                
-            await asyncio.sleep(self.check_interval)
+                await asyncio.sleep(self.check_interval)
     
     async def _check_and_send_ads(self):
+        started = time.perf_counter()
         current_time = int(time.time())
+        popped_ids = self._pop_due(current_time)
+        self._revoked_ads.clear()
+        self._revoked_chats.clear()
         
-        active_ads = await self.db.get_active_advertisements(current_time)
+        # Что отправлять, решает очередь: повторы после ошибок и отсрочки retry_after
+        # хранятся только в ней, а next_due_at таких объявлений в базе остаётся в прошлом
+        popped = set(popped_ids)
+        try:
+            ready_ads = await self.db.get_ads_for_sending(current_time)
+        except Exception:
+            # Иначе извлечённые объявления пропали бы из очереди до следующей полной сверки
+            for ad_id in popped_ids:
+                self.schedule(ad_id, current_time)
+            raise
+        due_ads = [ad for ad in ready_ads if ad.id in popped]
+        self._tick_results = dict.fromkeys(TICK_RESULTS, 0)
+        self._tick_results["due"] = len(due_ads)
         
-        for ad in active_ads:
-            chat_settings = await self.db.get_chat_settings(ad.chat_id)
+        # Запись в очереди, которой база не считает готовой к отправке, могла
+        # устареть (например, прочитана до записи предыдущей рассылки) — перечитываем её
+        for ad_id in popped.difference(ad.id for ad in due_ads):
+            self._spawn_refresh(self._refresh_ad(ad_id))
+        
+        # Объявления одного чата отправляются последовательно одним обработчиком,
+        # разные чаты — параллельно, но не более чем в self.concurrency потоков.
+        ads_by_chat: Dict[int, List[AdvertisementRecord]] = {}
+        for ad in due_ads:
+            ads_by_chat.setdefault(ad.chat_id, []).append(ad)
             
-            if not chat_settings or not chat_settings.is_enabled:
-                continue
-                
-            last_sent = await self.db.get_last_sent_time(ad.id)
-            interval_seconds = ad.interval_minutes * 60
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_ads in ads_by_chat.values():
+            queue.put_nowait(chat_ads)
+            
+        workers = [
+            asyncio.create_task(self._send_worker(queue))
+            for _ in range(min(self.concurrency, len(ads_by_chat)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await self._flush_sent()
+            self._record_tick(time.perf_counter() - started)
+    
+    def _record_tick(self, duration: float):
+        """Переносит итоги рассылки в метрики"""
+        metrics.SCHEDULER_TICK_SECONDS.observe(duration)
+        for result, count in self._tick_results.items():
+            metrics.SCHEDULER_TICK_ADS.labels(result).set(count)
+            if result != "due":
+                metrics.SCHEDULER_ADS_TOTAL.labels(result).inc(count)
+    
+    async def _flush_sent(self):
+        """Записывает накопленные времена отправки в базу одной транзакцией"""
+        if not self._pending_sent:
+            return
             
-            if last_sent is None or (current_time - last_sent) >= interval_seconds:
-                success = await self._send_advertisement(ad)
+        sent, self._pending_sent = self._pending_sent, []
+        try:
+            await self.db.update_last_sent_times(sent)
+        except Exception:
+            self._pending_sent[:0] = sent
+            raise
+    
+    async def _send_worker(self, queue: asyncio.Queue):
+        while True:
+            try:
+                chat_ads = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
                 
-                if success:
-                    await self.db.update_last_sent_time(ad.id, current_time)
+            for index, ad in enumerate(chat_ads):
+                # Ожидание в лимитере (retry_after или исчерпанный лимит чата) заняло бы
+                # обработчик, а рассылка ждёт всех обработчиков, поэтому оставшиеся
+                # объявления чата переносятся и не задерживают другие чаты
+                wait = self.limiter.wait_time(ad.chat_id) if self.limiter else 0
+                if wait > 0:
+                    self._defer(chat_ads[index:], math.ceil(wait))
+                    break
+                    
+                try:
+                    await self._process_ad(ad)
+                except TelegramRetryAfter as e:
+                    logger.warning(
+                        f"Лимит Telegram для чата {ad.chat_id}, "
+                        f"отправка отложена на {e.retry_after} с"
+                    )
+                    self._defer(chat_ads[index:], e.retry_after)
+                    break
+                except Exception as e:
+                    logger.error(f"Ошибка при обработке рекламы ID {ad.id}: {e}", exc_info=True)
+                    self._tick_results["failed"] += 1
+                    self._reschedule(ad, int(time.time()) + self.check_interval)
+    
+    def _defer(self, chat_ads: List[AdvertisementRecord], delay: int):
+        """Откладывает объявления чата на delay секунд, сохраняя их порядок"""
+        retry_at = int(time.time()) + delay
+        for ad in chat_ads:
+            self._reschedule(ad, retry_at)
+        self._tick_results["deferred"] += len(chat_ads)
     
-    async def _send_advertisement(self, ad: Advertisement) -> bool:
+    async def _process_ad(self, ad: AdvertisementRecord):
+        # get_ads_for_sending уже отобрал включённые чаты и наступившие next_due_at,
+        # поэтому дополнительных запросов к базе на каждое объявление не нужно
+        if ad.id in self._revoked_ads or ad.chat_id in self._revoked_chats:
+            self._tick_results["skipped"] += 1
+            return
+            
+        success = await self._send_advertisement(ad)
+        # Отправка могла ждать в лимитере, поэтому отсчёт идёт от её фактического времени
+        sent_at = int(time.time())
+        
+        if success:
+            self._tick_results["sent"] += 1
+            if ad.next_due_at is not None:
+                metrics.SCHEDULER_LAG_SECONDS.observe(max(0.0, time.time() - ad.next_due_at))
+            self._pending_sent.append((ad.id, sent_at))
+            self._reschedule(ad, sent_at + ad.interval_minutes * 60)
+            if len(self._pending_sent) >= self.flush_size:
+                try:
+                    await self._flush_sent()
+                except Exception as e:
+                    # Объявление уже отправлено: записи остаются в _pending_sent
+                    # и уйдут в базу со следующей записью в конце рассылки
+                    logger.error(f"Ошибка при записи времени отправки объявлений: {e}", exc_info=True)
+        else:
+            self._tick_results["failed"] += 1
+            self._reschedule(ad, sent_at + self.check_interval)
+    
+    async def _send_advertisement(self, ad: AdvertisementRecord) -> bool:
         try:
             keyboard = None
             
@@ -119,6 +398,9 @@ class AdvertisementScheduler:
                 logger.info(f"Сообщение отправлено в тему ID {ad.topic_id}")
             return True
             
+        except TelegramRetryAfter:
+            raise
+            
         except TelegramAPIError as e:
             error_message = str(e)
             
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, List
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+
+# (bot_id, chat_id, user_id) -> есть ли у пользователя незавершённый сценарий FSM
+StateProbe = Callable[[int, int, int], bool]
+
+
+class UpdatePrefilter:
+    """Отбрасывает сырые обновления из групп, которые не дойдут ни до одного обработчика"""
+
+    # В группах бот реагирует только на команды и на ввод пользователей, находящихся
+    # в сценарии FSM (создание объявления и т.п.). Если появится обработчик обычных
+    # сообщений в группах, фильтр нужно расширить или выключить (PREFILTER_UPDATES).
+
+    def __init__(self, has_state: StateProbe):
+        self.has_state = has_state
+        self.dropped = 0
+
+    def is_relevant(self, bot_id: int, update: Dict[str, Any]) -> bool:
+        message = update.get("message")
+        if message is None:
+            return True
+
+        chat = message.get("chat") or {}
+        if chat.get("type") == "private":
+            return True
+
+        text = message.get("text") or message.get("caption") or ""
+        if text.startswith("/"):
+            return True
+
+        user = message.get("from")
+        if user is None:
+            return False
+        return self.has_state(bot_id, chat.get("id"), user.get("id"))
+
+    def filter_updates(self, bot_id: int, updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Оставляет из пачки getUpdates только нужные обновления"""
+        if not updates:
+            return updates
+
+        # Последнее обновление сохраняется всегда: по его update_id поллинг сдвигает
+        # offset, иначе отброшенные обновления приходили бы снова
+        kept = [update for update in updates[:-1] if self.is_relevant(bot_id, update)]
+        kept.append(updates[-1])
+        self.dropped += len(updates) - len(kept)
+        return kept
+
+
+class PrefilteringSession(AiohttpSession):
+    """Сессия aiohttp, пропускающая ответ getUpdates через UpdatePrefilter до разбора"""
+
+    def __init__(self, prefilter: UpdatePrefilter, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.prefilter = prefilter
+        self._raw_json_loads = self.json_loads
+        self._bot_id = 0
+
+    def check_response(
+        self, bot: Bot, method: TelegramMethod[TelegramType], status_code: int, content: str
+    ) -> Response[TelegramType]:
+        if not isinstance(method, GetUpdates):
+            return super().check_response(bot, method, status_code, content)
+
+        # Разбор JSON и валидация идут синхронно внутри check_response, поэтому
+        # подмена json_loads на время вызова не затрагивает другие запросы
+        self._bot_id = bot.id
+        self.json_loads = self._filtering_json_loads
+        try:
+            return super().check_response(bot, method, status_code, content)
+        finally:
+            self.json_loads = self._raw_json_loads
+
+    def _filtering_json_loads(self, content: str) -> Any:
+        data = self._raw_json_loads(content)
+        if isinstance(data, dict) and data.get("ok") and isinstance(data.get("result"), list):
+            data["result"] = self.prefilter.filter_updates(self._bot_id, data["result"])
+        return data
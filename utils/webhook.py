@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import secrets
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import config
+from utils.update_filter import UpdatePrefilter
+
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookRequestHandler(SimpleRequestHandler):
+    """Принимает обновления от Telegram и обрабатывает не больше max_concurrency одновременно"""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_concurrency: int = config.WEBHOOK_MAX_CONCURRENCY,
+        prefilter: Optional[UpdatePrefilter] = None,
+        secret_token: Optional[str] = None,
+        **data: Any
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.prefilter = prefilter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        # Telegram получает ответ сразу, а лишние обновления даже не ставятся в очередь
+        update = await request.json(loads=bot.session.json_loads)
+        if self.prefilter is not None and not self.prefilter.is_relevant(bot.id, update):
+            self.prefilter.dropped += 1
+            return web.json_response({}, dumps=bot.session.json_dumps)
+
+        feed_update_task = asyncio.create_task(self._background_feed_update(bot=bot, update=update))
+        self._background_feed_update_tasks.add(feed_update_task)
+        feed_update_task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]):
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def close(self):
+        """Дожидается обработки принятых обновлений и закрывает сессию бота"""
+        if self._background_feed_update_tasks:
+            await asyncio.gather(*self._background_feed_update_tasks, return_exceptions=True)
+        await super().close()
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    allowed_updates: List[str],
+    prefilter: Optional[UpdatePrefilter] = None
+):
+    """Запускает встроенный aiohttp-сервер и работает до отмены"""
+    # Без секрета любой, кто достучится до порта, мог бы подделать обновления от имени
+    # администратора, поэтому при пустом WEBHOOK_SECRET он генерируется на время работы
+    secret_token = config.WEBHOOK_SECRET
+    if not secret_token:
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK_SECRET не задан, используется случайный секрет до перезапуска бота")
+
+    handler = WebhookRequestHandler(
+        dp,
+        bot,
+        prefilter=prefilter,
+        secret_token=secret_token
+    )
+    app = web.Application()
+    handler.register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBHOOK_HOST, config.WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Вебхук слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+
+    try:
+        if config.WEBHOOK_URL:
+            await bot.set_webhook(
+                url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+                secret_token=secret_token,
+                allowed_updates=allowed_updates,
+                max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                drop_pending_updates=True
+            )
+            logger.info("Вебхук зарегистрирован в Telegram")
+        else:
+            # Без внешнего адреса сервер принимает только обновления, присланные вручную
+            logger.warning("WEBHOOK_URL не задан, вебхук в Telegram не регистрируется")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()